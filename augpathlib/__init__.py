@@ -1,4 +1,4 @@
-from augpathlib.meta import PathMeta
+from augpathlib.meta import PathMeta, FrozenPathMeta
 from augpathlib.core import (AugmentedPath,
                              AugmentedPathPosix,
                              AugmentedPathWindows,
@@ -13,27 +13,51 @@ from augpathlib.caches import (CachePath,
                                SshCache)
 from augpathlib.remotes import RemotePath
 from augpathlib.utils import StatResult, FileSize, etag
-from augpathlib.zip import ZipHelper, ZipPath
 
-try:
-    from augpathlib.repo import RepoHelper, RepoPath
-except ImportError as e:
-    class RepoHelper:
-        def __init__(self, *args, __error=e, **kwargs):
+# zip, repo, package, and metatable pull in zipfile, git, requests, and numpy which are
+# slow to import and which most users of LocalPath never touch so they
+# are only imported on first access via module __getattr__
+_lazy = {
+    'ZipHelper': 'zip',
+    'ZipPath': 'zip',
+    'RepoHelper': 'repo',
+    'RepoPath': 'repo',
+    'PackagePath': 'package',
+    'PathMetaTable': 'metatable',
+}
+
+
+def _import_error_class(name, error):
+    class ImportErrorHelper:
+        def __init__(self, *args, __error=error, **kwargs):
             raise ImportError(f'{self.__class__.__name__} could not be imported '
                               'due to a previous ImportError') from __error
 
+    ImportErrorHelper.__name__ = ImportErrorHelper.__qualname__ = name
+    return ImportErrorHelper
 
-    class RepoPath(RepoHelper):
-        pass
 
-try:
-    from augpathlib.package import PackagePath
-except ImportError as e:
-    class PackagePath:
-        def __init__(self, *args, __error=e, **kwargs):
-            raise ImportError(f'{self.__class__.__name__} could not be imported '
-                              'due to a previous ImportError') from __error
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    import importlib
+    module_name = _lazy[name]
+    try:
+        module = importlib.import_module(f'{__name__}.{module_name}')
+        value = getattr(module, name)
+    except ImportError as e:
+        if module_name in ('zip', 'metatable'):
+            raise e
+
+        value = _import_error_class(name, e)
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
 
 
 __all__ = [
@@ -42,6 +66,7 @@ __all__ = [
     'etag',
 
     'PathMeta',
+    'FrozenPathMeta',
 
     'AugmentedPath',
     'XattrPath',
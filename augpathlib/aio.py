@@ -0,0 +1,196 @@
+""" asyncio counterparts to the blocking LocalPath operations
+
+every blocking call runs on one shared bounded thread pool so any
+number of concurrent awaits costs at most executor_jobs threads,
+file data is read one chunk per executor job so that large files
+do not hold a worker for their whole duration and many operations
+progress together
+
+writes go through the same LocalPath._data_write as the data setter
+so data_atomic and the cache meta are handled the same way, it consumes
+a generator so each write holds a worker of a second pool of the same
+size until it is done, chunks from an async iterable are still pulled
+on the event loop so async sources that use the first pool cannot
+starve it
+
+these are exposed as LocalPath.adata, awrite_data, ameta, achecksum,
+and archildren, this module is only imported on first use """
+
+import os
+import asyncio
+import threading
+from functools import partial
+from augpathlib.utils import default_jobs, default_cypher
+
+executor_jobs = None  # None -> default_jobs(), set before first use to change it
+_executors = {}
+_executor_lock = threading.Lock()
+_done = object()
+
+
+def _executor(name):
+    with _executor_lock:
+        if name not in _executors:
+            from concurrent.futures import ThreadPoolExecutor
+            jobs = default_jobs() if executor_jobs is None else executor_jobs
+            _executors[name] = ThreadPoolExecutor(max_workers=jobs,
+                                                  thread_name_prefix=name)
+
+        return _executors[name]
+
+
+def executor():
+    """ the shared executor, created on first use """
+    return _executor('augpathlib-aio')
+
+
+def write_executor():
+    """ the executor that runs writes, created on first use """
+    return _executor('augpathlib-aio-write')
+
+
+async def run(function, *args, **kwargs):
+    """ await function(*args, **kwargs) on the shared executor """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor(), partial(function, *args, **kwargs))
+
+
+def _next_batch(iterator, size):
+    batch = []
+    for item in iterator:
+        batch.append(item)
+        if len(batch) >= size:
+            break
+
+    return batch
+
+
+async def aiterate(iterable, batch=64):
+    """ async iterate over a blocking iterable pulling batch items per
+        executor job, the iterable itself is also created in the executor
+        if it is a zero argument callable """
+    if callable(iterable):
+        iterable = await run(iterable)
+
+    iterator = await run(iter, iterable)
+    while True:
+        items = await run(_next_batch, iterator, batch)
+        for item in items:
+            yield item
+
+        if len(items) < batch:
+            break
+
+
+def _open_read(path, chunksize):
+    f = open(path, 'rb', buffering=0)
+    if chunksize is None:
+        chunksize = path._stream_chunksize(os.fstat(f.fileno()))
+
+    return f, chunksize
+
+
+async def adata(path, chunksize=None):
+    """ async generator of the bytes of path in chunks """
+    f, chunksize = await run(_open_read, path, chunksize)
+    try:
+        while True:
+            chunk = await run(f.read, chunksize)
+            if not chunk:
+                break
+
+            yield chunk
+    finally:
+        await run(f.close)
+
+
+async def _anext(iterator):
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return _done
+
+
+class _Pull:
+    """ blocking iterator for a worker thread that pulls each item
+        of an async iterable by running __anext__ on the event loop """
+
+    def __init__(self, aiterable, loop):
+        self.iterator = aiterable.__aiter__()
+        self.loop = loop
+        self.future = None
+        self.cancelled = False
+
+    def __iter__(self):
+        while True:
+            self.future = asyncio.run_coroutine_threadsafe(_anext(self.iterator), self.loop)
+            if self.cancelled:
+                self.future.cancel()
+
+            item = self.future.result()
+            if item is _done:
+                return
+
+            yield item
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+async def awrite_data(path, chunks):
+    """ async version of the LocalPath.data setter, chunks may be
+        an async iterable or a regular iterable of bytes, no chunks
+        writes an empty file just as the setter does """
+    loop = asyncio.get_running_loop()
+    pull = _Pull(chunks, loop) if hasattr(chunks, '__aiter__') else None
+    write = partial(path._data_write, chunks if pull is None else pull,
+                    atomic=path.data_atomic)
+    try:
+        await loop.run_in_executor(write_executor(), write)
+    except asyncio.CancelledError as e:
+        # stop the writer at its next chunk, an atomic write is abandoned
+        if pull is not None:
+            pull.cancel()
+
+        raise e
+
+
+async def ameta(path):
+    return await run(getattr, path, 'meta')
+
+
+def _update(f, hashers, chunksize):
+    chunk = f.read(chunksize)
+    for m in hashers:
+        m.update(chunk)
+
+    return len(chunk)
+
+
+async def achecksum(path, cypher=default_cypher, extra_cyphers=tuple()):
+    """ async version of LocalPath.checksum, each chunk is read and
+        hashed in a single executor job so the loop never hashes """
+    if not await run(path.is_file):
+        return
+
+    cypher = path._resolve_cypher(cypher)
+    hashers = [cypher()] + [c() for c in extra_cyphers]
+    f, chunksize = await run(_open_read, path, None)
+    try:
+        while await run(_update, f, hashers, chunksize):
+            pass
+    finally:
+        await run(f.close)
+
+    if extra_cyphers:
+        return tuple(m.digest() for m in hashers)
+    else:
+        return hashers[0].digest()
+
+
+async def archildren(path, batch=64):
+    """ async generator over path.rchildren """
+    async for child in aiterate(lambda: path.rchildren, batch=batch):
+        yield child
@@ -2,8 +2,8 @@ import sys
 import pathlib
 import warnings
 from augpathlib import exceptions as exc
-from augpathlib.meta import PathMeta
-from augpathlib.core import AugmentedPath, EatPath
+from augpathlib.meta import PathMeta, _PathMetaAsXattrs
+from augpathlib.core import AugmentedPath, EatPath, invalidate_cache_roots
 from augpathlib.utils import log, fs_safe_id
 from augpathlib.utils import default_cypher, cypher_lookup
 from augpathlib.utils import LOCAL_DATA_DIR, SPARSE_MARKER
@@ -70,6 +70,7 @@ class _CachePath(AugmentedPath):
         if '_anchor' in acls.__dict__:
             # can't use hasattr because it traverses the mro
             # and we only care about the immediate class
+            invalidate_cache_roots()
             return delattr(acls, '_anchor')
 
     def anchorClassHere(self, remote_init=True):
@@ -80,6 +81,7 @@ class _CachePath(AugmentedPath):
         # which is OK for the path where local/remote binding has already
         # been completed
         if '_anchor' not in self.__class__.__dict__:
+            invalidate_cache_roots()
             self.__class__._abstract_class()._anchor = self
             self.local_data_dir_init()  # call every time for insurance
             self._remote_class.anchorToCache(self, init=remote_init)
@@ -467,7 +469,8 @@ class _CachePath(AugmentedPath):
         #rcs = sname(self.remote._rchildren(create_cache=False, sparse=sparse))
         rcs = self.remote._rchildren(create_cache=False, sparse=sparse)
 
-        local_paths = list(self.local.rchildren)
+        # consumed right away so the listing can answer the is_* checks
+        local_paths = list(self.local._rchildren(cache=True))
         local_files = set(p for p in local_paths if p.is_file() or p.is_broken_symlink())
         file_index = {f.cache_id:f for f in local_files}  # FIXME WARNING can get big
         # FIXME have to compute file_index here because for some reason
@@ -598,7 +601,7 @@ class _CachePath(AugmentedPath):
     def validate_file(self):
         meta = self.meta
         if meta.etag:
-            local_checksum, local_count = self.local.etag(meta.chunksize)
+            local_checksum, local_count = self.local.etag(meta.chunksize, jobs=None)
             cache_checksum, cache_count = meta.etag
             if local_checksum != cache_checksum or local_count != cache_count:
                 msg = (f'etags do not match!\n(!='
@@ -892,43 +895,66 @@ class _CachePath(AugmentedPath):
         size_not_ok = size_limit_mb is not None and meta.size is not None and meta.size.mb > size_limit_mb
 
         if size_ok or size_limit_mb is None:  # FIXME should we force fetch here by default if the file exists?
+            link = None
             if self.is_broken_symlink():
                 # FIXME touch a temporary file and set the meta first!
+                # the placeholder carries the meta while the data is
+                # fetched, if the fetch fails the link is put back so
+                # that an empty file never claims to have the full data
+                link = self.readlink(raw=True)
                 self.unlink()
                 self.touch()
                 self._meta_setter(meta)
 
-            # FIXME I'm 99% certain that our mysterious zero size files are happening here
-            # and the error is getting caught and silence somehow
-            log.info(f'Fetching remote via cache id {self.id} -> {self.local}')
-            existing_cache_cache = self.local_object_cache_path.exists()
-            self.local.data = self.data  # note that this should trigger storage to .ops/objects
-            if self.local.size != meta.size:
-                m2 = '.operations/objects/' + self.id.replace(':', '\\:')  # FIXME not abstracted
-                msg = (f'{self.local.size} != {meta.size} for {self.local}\n{m2}\n'
-                       f'from previous fetch? {existing_cache_cache}')
-                raise ValueError(msg)
-
-            if meta.errors and 'checksum-mismatch' in meta.errors:
-                # on a fetch where the file already exists checksum
-                # as being checked again, so this prevents the recheck
-                pass
-            else:
-                _lc = self.local.checksum(cypher=self._instance_cypher())
-                if meta.checksum is not None and _lc != meta.checksum:
-                    # FIXME these checks need to be happning inside of
-                    # the local.data setter since otherwise this is overkill
-                    #breakpoint()
-                    msg = f'{_lc.hex()!r} != {meta.checksum.hex()!r} for {self!r}'
-                    log.critical(msg)
-                    nmeta = {k: v for k, v in meta.items()}
-                    nmeta['errors'] += ('checksum-mismatch',)
-                    self._meta_setter(meta.__class__(**nmeta))
-                    #raise BaseException()
+            try:
+                self._fetch_verified(meta, link)
+            except BaseException as e:
+                self._fetch_restore(link)
+                raise e
 
         if size_not_ok:
             log.warning(f'File is over the size limit {meta.size.mb} > {size_limit_mb}')
 
+    def _fetch_verified(self, meta, link):
+        # FIXME I'm 99% certain that our mysterious zero size files are happening here
+        # and the error is getting caught and silence somehow
+        log.info(f'Fetching remote via cache id {self.id} -> {self.local}')
+        existing_cache_cache = self.local_object_cache_path.exists()
+        # on a fetch where the file already exists and a previous
+        # fetch recorded a checksum mismatch the checksum is not
+        # verified again so that the data can be installed anyway
+        recheck = not (meta.errors and 'checksum-mismatch' in meta.errors)
+        try:
+            # verified while writing and only renamed into place if ok
+            # note that this should trigger storage to .ops/objects
+            self.local.write_verified(
+                self.data,
+                size=meta.size,
+                checksum=meta.checksum if recheck else None,
+                cypher=self._instance_cypher(),
+                etag=meta.etag if recheck and meta.chunksize else None,
+                etag_chunksize=meta.chunksize if recheck and meta.etag else None)
+        except exc.SizeError as e:
+            m2 = '.operations/objects/' + self.id.replace(':', '\\:')  # FIXME not abstracted
+            msg = (f'{e}\n{m2}\n'
+                   f'from previous fetch? {existing_cache_cache}')
+            raise ValueError(msg) from e
+        except exc.ChecksumError as e:
+            log.critical(f'{e} via {self!r}')
+            nmeta = {k: v for k, v in meta.items()}
+            nmeta['errors'] += ('checksum-mismatch',)
+            nmeta = meta.__class__(**nmeta)
+            if link is None:
+                self._meta_setter(nmeta)
+            else:  # the placeholder is empty so record the mismatch on the link
+                self._fetch_restore(nmeta.as_symlink(local_name=self.local.name))
+
+    def _fetch_restore(self, link):
+        """ replace the placeholder of a failed fetch with a broken symlink """
+        if link is not None and not self.is_symlink():
+            self.unlink()
+            self.symlink_to(link)
+
     def move(self, *, remote=None, target=None, meta=None):
         """ instantiate a new cache and cleanup self because we are moving """
         # FIXME what to do if we have data
@@ -1070,10 +1096,19 @@ ReflectiveCache._bind_flavours()
 class EatCache(EatPath, _CachePath):
 
     xattr_prefix = None
+    # write meta as a single packed xattr instead of one per field,
+    # the packed xattr is always preferred when reading if present
+    xattr_packed = True
 
     @property
     def meta(self):
         if self.exists():
+            try:
+                blob = self.getxattr(PathMeta.packed_key(self.xattr_prefix))
+                return PathMeta.from_packed(blob, self.xattr_prefix, self)
+            except exc.NoStreamError:
+                pass
+
             xattrs = self.xattrs()
             pathmeta = PathMeta.from_xattrs(xattrs, self.xattr_prefix, self)
             return pathmeta
@@ -1091,7 +1126,22 @@ class EatCache(EatPath, _CachePath):
             # where the checksum differs, the old version needs to be
             # trashed before any of this is written, otherwise the old
             # metadata is lost >_<
-            self.setxattrs(pathmeta.as_xattrs(self.xattr_prefix))
+            packed_key = PathMeta.packed_key(self.xattr_prefix)
+            if self.xattr_packed:
+                self.setxattr(packed_key, pathmeta.as_packed(self.xattr_prefix))
+                # per field values from before would come back stale
+                # if the file were ever read or written unpacked again
+                prefix = f'{self.xattr_prefix}.' if self.xattr_prefix else ''
+                fields = {f'{prefix}{field}'.encode() for field in _PathMetaAsXattrs.fields}
+                for key in self.xattr_keys():
+                    if key in fields:
+                        self.delxattr(key)
+
+            else:
+                # a stale packed blob would shadow the per field values
+                self.delxattr(packed_key)
+                self.setxattrs(pathmeta.as_xattrs(self.xattr_prefix))
+
             if hasattr(self, '_meta'):  # prevent reading from in-memory store
                 delattr(self, '_meta')
 
@@ -5,28 +5,33 @@ import shutil
 import pathlib
 import tempfile
 import warnings
+import threading
 import mimetypes
 import subprocess
 from time import sleep
+from uuid import uuid4
 from errno import ELOOP, ENOENT, ENOTDIR, EBADF
 from datetime import datetime, timezone
+from stat import S_ISREG, S_ISLNK, S_ISDIR
 from functools import wraps
+from collections import OrderedDict
+from contextlib import contextmanager
 from itertools import chain
-try:
-    import magic  # from sys-apps/file consider python-magic ?
-    _have_magic = True
-except (AttributeError, ImportError, TypeError) as e:
-    _have_magic = False
-
 #import psutil  # import for experimental xopen functionality
 #from Xlib.display import Display
 #from Xlib import Xatom
 import augpathlib as aug
 from augpathlib import swap
+from augpathlib import tree
+from augpathlib import fastcopy
+from augpathlib import ranges as ranges_
+from augpathlib import mime
+from augpathlib import statx
 from augpathlib import exceptions as exc
 from augpathlib.meta import PathMeta
 from augpathlib.utils import log, StatResult, etag
 from augpathlib.utils import default_cypher, cypher_algo
+from augpathlib.utils import bounded_imap_unordered
 from augpathlib.utils import _bind_sysid_, AUG_XATTR_PREFIX
 
 SPARSE_KEY = (AUG_XATTR_PREFIX + '.sparse')
@@ -119,6 +124,76 @@ def _catch_wrapper(func):
 
 #pathlib._NormalAccessor.stat = _catch_wrapper(os.stat)  # can't wrap stat, pathlib needs the errors
 
+
+_unset = object()
+_snapshot_local = threading.local()
+
+# (cache class, absolute directory string) -> cache root
+_cache_roots = {}
+
+
+def invalidate_cache_roots():
+    """ forget every memoized result of LocalPath.find_cache_root """
+    _cache_roots.clear()
+
+
+class _StatSnapshot:
+    """ one lstat and at most one stat for a path, None if missing """
+
+    __slots__ = 'token', 'lstat', '_stat'
+
+    def __init__(self, path, token):
+        self.token = token
+        self.lstat = self._try(os.lstat, path)
+        if self.lstat is not None and S_ISLNK(self.lstat.st_mode):
+            self._stat = _unset  # only follow the link if someone asks
+        else:
+            self._stat = self.lstat
+
+    @staticmethod
+    def _try(function, path):
+        try:
+            return function(path)
+        except OSError as e:
+            if not _ignore_error(e):
+                raise
+
+    def stat(self, path):
+        if self._stat is _unset:
+            self._stat = self._try(os.stat, path)
+
+        return self._stat
+
+
+class _LruMemo:
+    """ thread safe mapping that forgets the least recently used
+        keys beyond maxsize, the default checksum memo store """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+
+            return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
 # pathlib helpers, simplify the inheritance nightmare ...
 
 
@@ -277,6 +352,20 @@ class ADSHelper(EatHelper):
         except FileNotFoundError as e:
             raise FileNotFoundError(self) from e
 
+    def xattr_keys(self, namespace=XATTR_DEFAULT_NS):
+        """ keys of xattrs without reading their values """
+        if not self.is_absolute():
+            self = self.resolve()  # see _xattrs
+
+        ns_length_p1 = len(namespace) + 1
+        try:
+            return [k[ns_length_p1:].encode()
+                    for stream in self._streams
+                    for _base, k in (stream.name.split(':', 1),)
+                    if k.startswith(namespace)]
+        except FileNotFoundError as e:
+            raise FileNotFoundError(self) from e
+
 
 class XattrHelper(EatHelper):
     """ pathlib helper augmented with xattr support """
@@ -320,6 +409,13 @@ class XattrHelper(EatHelper):
         except FileNotFoundError as e:
             raise FileNotFoundError(self) from e
 
+    def xattr_keys(self, namespace=XATTR_DEFAULT_NS):
+        """ keys of xattrs without reading their values """
+        try:
+            return xattr.list(self.as_posix(), namespace=namespace)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(self) from e
+
 
 # remote data about remote objects -> remote_meta
 # local data about remote objects -> cache_meta
@@ -427,6 +523,17 @@ class AugmentedPath(pathlib.Path):
             to their own children, which is fine because that is what we do
             so a reasonable way to short circuit the issue """
         try:
+            snap = self._snapshot()
+            if snap is not None:
+                return snap.stat(self) is not None
+
+            if self._dirent is not None:
+                if not self._dirent.is_symlink():
+                    return True
+
+                self._dirent.stat()  # cached by the DirEntry
+                return True
+
             return super().exists()
         except OSError as e:
             #log.error(e)   # too noisy ... though it reaveals we call exists a lot
@@ -437,6 +544,14 @@ class AugmentedPath(pathlib.Path):
 
     def is_file(self):
         try:
+            snap = self._snapshot()
+            if snap is not None:
+                st = snap.stat(self)
+                return st is not None and S_ISREG(st.st_mode)
+
+            if self._dirent is not None:
+                return self._dirent.is_file()
+
             return super().is_file()
         except OSError as e:
             if not _ignore_error(e):
@@ -446,6 +561,14 @@ class AugmentedPath(pathlib.Path):
 
     def is_dir(self):
         try:
+            snap = self._snapshot()
+            if snap is not None:
+                st = snap.stat(self)
+                return st is not None and S_ISDIR(st.st_mode)
+
+            if self._dirent is not None:
+                return self._dirent.is_dir()
+
             return super().is_dir()
         except OSError as e:
             if not _ignore_error(e):
@@ -455,6 +578,13 @@ class AugmentedPath(pathlib.Path):
 
     def is_symlink(self):
         try:
+            snap = self._snapshot()
+            if snap is not None:
+                return snap.lstat is not None and S_ISLNK(snap.lstat.st_mode)
+
+            if self._dirent is not None:
+                return self._dirent.is_symlink()
+
             return super().is_symlink()
         except OSError as e:
             if not _ignore_error(e):
@@ -471,6 +601,133 @@ class AugmentedPath(pathlib.Path):
     def exists_not_symlink(self):
         return self.exists() and not self.is_symlink()
 
+    stat_snapshot = False  # opt in to reusing one lstat for exists, is_* and size
+    _snap = None
+    _dirent = None  # os.DirEntry for paths from scandir(cache=True)
+
+    def _snapshot(self):
+        token = getattr(_snapshot_local, 'token', None)
+        if token is None:
+            if not self.stat_snapshot:
+                return
+
+            token = True
+
+        snap = self._snap
+        if snap is None or snap.token is not token:
+            snap = self._snap = _StatSnapshot(self, token)
+
+        return snap
+
+    def invalidate_stat(self):
+        """ forget the stat snapshot and any DirEntry from scandir
+            so that the next check goes back to the file system """
+        self._snap = None
+        self._dirent = None
+
+    @staticmethod
+    @contextmanager
+    def stat_snapshots():
+        """ for the duration of the block every path in this thread answers
+            exists, is_* and size from one lstat (plus one stat if it is a
+            symlink) taken the first time it is asked, snapshots are
+            discarded when the outermost block exits
+
+            with AugmentedPath.stat_snapshots():
+                files = [p for p in paths if p.is_file() or p.is_broken_symlink()]
+
+            stat() and lstat() themselves always go to the file system,
+            paths changed by other paths or processes inside the block
+            should call invalidate_stat """
+        outer = getattr(_snapshot_local, 'token', None)
+        if outer is None:
+            _snapshot_local.token = object()
+
+        try:
+            yield
+        finally:
+            if outer is None:
+                _snapshot_local.token = None
+
+    def _from_dirent(self, entry, follow_stat=False, cache=False):
+        """ make a child path from entry, with cache=True the child
+            answers exists and is_* from entry, which caches the results
+            so the checks cost no syscalls on file systems that report
+            d_type, stat() is never cached """
+        if hasattr(self, '_make_child_relpath'):
+            child = self._make_child_relpath(entry.name)
+        else:
+            child = self / entry.name
+
+        if not cache:
+            return child
+
+        if follow_stat:
+            try:
+                entry.stat()  # populate the follow stat cache
+            except OSError as e:
+                if not _ignore_error(e):
+                    raise
+
+        child._dirent = entry
+        return child
+
+    def scandir(self, follow_stat=False, cache=False):
+        """ like iterdir but backed by os.scandir
+
+            cache=True children keep their os.DirEntry and answer
+            exists and is_* from it from then on without going back to
+            the file system, only use it when the paths are consumed
+            right away, changes made through other paths or processes
+            are not seen, mutating methods on the path itself do clear
+            the entry, see also stat_snapshots """
+        with os.scandir(self) as it:
+            for entry in it:
+                yield self._from_dirent(entry, follow_stat=follow_stat, cache=cache)
+
+    def rscandir(self, follow_stat=False, jobs=1, order='unordered', cache=False):
+        """ like rglob('*') but directory types come from the listing
+            so descending into the tree costs no extra stat calls
+
+            entries in a directory are yielded before descending
+            into its subdirectories, symlinked directories are not
+            traversed and unreadable subdirectories are skipped
+
+            jobs other than 1 lists directories on a pool of threads
+            see tree.scandir_parallel for jobs and order, in that
+            case only the order option determines the ordering
+
+            cache is the same as for scandir """
+        for directory, children in tree.scandir_parallel(
+                self, jobs=jobs, order=order, follow_stat=follow_stat, cache=cache):
+            yield from children
+
+    def unlink(self, *args, **kwargs):
+        self.invalidate_stat()
+        return super().unlink(*args, **kwargs)
+
+    def rmdir(self):
+        self.invalidate_stat()
+        return super().rmdir()
+
+    def mkdir(self, *args, **kwargs):
+        self.invalidate_stat()
+        return super().mkdir(*args, **kwargs)
+
+    def touch(self, *args, **kwargs):
+        self.invalidate_stat()
+        return super().touch(*args, **kwargs)
+
+    def symlink_to(self, *args, **kwargs):
+        self.invalidate_stat()
+        return super().symlink_to(*args, **kwargs)
+
+    def open(self, mode='r', *args, **kwargs):
+        if set(mode) & set('wax+'):
+            self.invalidate_stat()
+
+        return super().open(mode, *args, **kwargs)
+
     def resolve(self):
         try:
             return super().resolve()
@@ -532,6 +789,7 @@ class AugmentedPath(pathlib.Path):
         return ort / self.relative_to(base)
 
     def rename(self, target):
+        self.invalidate_stat()
         os.rename(self, target)
 
     def swap_carefree(self, target):
@@ -570,33 +828,92 @@ class AugmentedPath(pathlib.Path):
             2. if the paths to be swapped are on different devices
             3. if either path does not exist
         """
-        se = self.exists()
-        te = target.exists()
-        if not se:
+        self.invalidate_stat()
+        invalidate = getattr(target, 'invalidate_stat', None)
+        if invalidate is not None:  # target may be a plain pathlib.Path
+            invalidate()
+
+        if type(self)._swap is swap.swap_not_implemented:
+            # report missing paths before the missing swap as always
+            self._swap_check_exists(target)
+
+        try:
+            self._swap(target)
+        except FileNotFoundError as e:
+            # only look at the paths once we know something is wrong
+            self._swap_check_exists(target, e)
+            raise e
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                sd = self.stat().st_dev
+                td = target.stat().st_dev
+                msg = f'Self and target must be on the same device! {sd} != {td}'
+                raise ValueError(msg) from e # FIXME find or make the correct error type
+
+            raise e
+
+    def _swap_check_exists(self, target, error=None):
+        if not self.exists():
             msg = f'Both self and target must exist self does not! {self}'
-            raise FileNotFoundError(msg)
-        elif not te:
+            raise FileNotFoundError(msg) from error
+        elif not target.exists():
             msg = f'Both self and target must exist target does not! {target}'
-            raise FileNotFoundError(msg)
+            raise FileNotFoundError(msg) from error
 
-        sd = self.stat().st_dev
-        td = target.stat().st_dev
-        if sd != td:
-            msg = f'Self and target must be on the same device! {sd} != {td}'
-            raise ValueError(msg) # FIXME find or make the correct error type
+    def swap_children(self, other, names=None):
+        """ replace children of other with the children of self with the
+            same names in a single swap.SwapTransaction, e.g. to publish
+            a freshly generated directory of files over an old one
 
-        self._swap(target)
+            afterward self holds whatever was replaced, names defaults to
+            every child of self, if any swap fails all are rolled back """
+        if names is None:
+            names = [c.name for c in self.scandir()]
 
-    if sys.version_info >= (3, 12):  # 3.12 has walk built in
-        def rmdirtree(self):
-            """ like rmtree but only for empty folders
-            find path -type d -empty -delete
-            """
-            if self.is_symlink():
-                # match behavior of find ${symlink}
-                msg = f'{self} is a symlink'
-                raise NotADirectoryError(msg)
+        with swap.SwapTransaction() as transaction:
+            for name in names:
+                transaction.add(self / name, other / name)
 
+    def rmdirtree(self, jobs=1):
+        """ like rmtree but only for empty folders
+        find path -type d -empty -delete
+
+        jobs other than 1 lists the tree on a pool of threads
+        and removes each level of empty folders in parallel
+        """
+        if self.is_symlink():
+            # match behavior of find ${symlink}
+            msg = f'{self} is a symlink'
+            raise NotADirectoryError(msg)
+
+        if jobs == 1:
+            self._rmdirtree()
+        else:
+            self._rmdirtree_parallel(jobs)
+
+    def _rmdirtree_parallel(self, jobs):
+        # FIXME holds the listing of every directory in memory
+        counts, levels = {}, {}
+        for directory, children in tree.scandir_parallel(self, jobs=jobs, cache=True):
+            subdirs = [c for c in children if c.is_dir() and not c.is_symlink()]
+            counts[directory] = len(children) - len(subdirs), subdirs
+            levels.setdefault(len(directory.parts), []).append(directory)
+
+        deleted = set()
+        for level in sorted(levels, reverse=True):
+            empty = [d for d in levels[level]
+                     if not counts[d][0] and
+                     all(s in deleted for s in counts[d][1])]
+            for directory, _ in bounded_imap_unordered(
+                    lambda d: d.rmdir(), empty, jobs=jobs):
+                deleted.add(directory)
+
+            # the next level up only cares about this level
+            deleted.difference_update(
+                s for d in levels[level] for s in counts[d][1])
+
+    if sys.version_info >= (3, 12):  # 3.12 has walk built in
+        def _rmdirtree(self):
             deleted = set()
             for path, subs, files in self.walk(top_down=False):
                 has_subs = False
@@ -618,15 +935,7 @@ class AugmentedPath(pathlib.Path):
                     deleted.difference_update(sps)
 
     else:  # os.walk version
-        def rmdirtree(self):
-            """ like rmtree but only for empty folders
-            find path -type d -empty -delete
-            """
-            if self.is_symlink():
-                # match behavior of find ${symlink}
-                msg = f'{self} is a symlink'
-                raise NotADirectoryError(msg)
-
+        def _rmdirtree(self):
             deleted = set()
             for path_string, subs, files in os.walk(self, topdown=False):
                 has_subs = False
@@ -647,10 +956,22 @@ class AugmentedPath(pathlib.Path):
                     # keeps potential memory usage down
                     deleted.difference_update(sps)
 
-    def rmtree(self, ignore_errors=False, onerror=None, DANGERZONE=False):
-        """ DANGER ZONE """
-        # FIXME make this atomic by renaming to a random name
-        # that doesn't exist and then calling rmtree on that
+    def rmtree(self, ignore_errors=False, onerror=None, DANGERZONE=False, jobs=1,
+               background=False, progress=None):
+        """ DANGER ZONE
+
+            where the os supports dir_fd removal works relative to open
+            directory file descriptors see tree.rmtree_contents, jobs
+            other than 1 removes subtrees concurrently and onerror may
+            be called from the worker threads, progress() is called for
+            each entry removed, elsewhere (windows) removal is serial
+            and jobs is ignored
+
+            background=True renames the path to a random hidden sibling
+            which removes it from the namespace atomically, deletes the
+            sibling on a background thread and returns a
+            tree.BackgroundRemoval handle, errors are collected on the
+            handle and are only raised by onerror """
         if not self.is_absolute():
             raise exc.WillNotRemovePathError(f'Only absolute paths can be removed recursively. {self}')
 
@@ -664,6 +985,9 @@ class AugmentedPath(pathlib.Path):
             elif self == pathlib.Path.cwd():
                 raise exc.WillNotRemovePathError(f'Will not remove current working directory. {self}')
 
+        if background:
+            return self._rmtree_background(ignore_errors, onerror, DANGERZONE, jobs)
+
         try:
             if self.is_dir():
                 if self.is_symlink():
@@ -677,21 +1001,34 @@ class AugmentedPath(pathlib.Path):
                 else:
                     lp = self
 
-                for path in lp.iterdir():
-                    if path.is_symlink():
-                        # mimic shutil behavior and don't accidentally
-                        # recurse through symlinks (keyword being curse)
-                        path.unlink()
-                    else:
-                        path.rmtree(ignore_errors=ignore_errors,
-                                    onerror=onerror,
-                                    DANGERZONE=DANGERZONE)
+                if tree._fd_functions:
+                    path = self
+                    tree.rmtree_contents(
+                        lp, self._rmtree_onerror(ignore_errors, onerror),
+                        jobs=jobs, progress=progress)
+                else:
+                    for path in lp.iterdir():
+                        if path.is_symlink():
+                            # mimic shutil behavior and don't accidentally
+                            # recurse through symlinks (keyword being curse)
+                            path.unlink()
+                            if progress is not None:
+                                progress()
+                        else:
+                            path.rmtree(ignore_errors=ignore_errors,
+                                        onerror=onerror,
+                                        DANGERZONE=DANGERZONE,
+                                        progress=progress)
 
                 path = self
                 self.rmdir()
+                if progress is not None:
+                    progress()
             else:
                 path = self
                 self.unlink()
+                if progress is not None:
+                    progress()
 
         except exc.WillNotRemovePathError:
             raise
@@ -705,6 +1042,53 @@ class AugmentedPath(pathlib.Path):
                 else:
                     raise e
 
+    def _rmtree_background(self, ignore_errors, onerror, DANGERZONE, jobs):
+        if hasattr(self, 'local'):
+            # cache case
+            lp = self.local
+        else:
+            lp = self
+
+        # same parent so always the same device and rename is atomic
+        trash = lp.with_name(f'.{lp.name}.rmtree-{uuid4().hex}')
+        handle = tree.BackgroundRemoval(self, trash)
+        try:
+            if lp.is_dir() and lp.is_symlink():
+                raise OSError("Cannot call rmtree on a symbolic link")
+
+            lp.rename(trash)
+        except OSError:
+            from concurrent.futures import Future
+            handle.trash = None
+            handle.future = Future()
+            handle.future.set_result(None)
+            self._rmtree_onerror(ignore_errors, onerror)(
+                os.rename, lp, sys.exc_info())
+            return handle
+
+        def remove():
+            # errors are always recorded on the handle and never
+            # raised on the background thread unless onerror does
+            trash.rmtree(onerror=handle._onerror(None if ignore_errors else onerror),
+                         DANGERZONE=DANGERZONE,
+                         jobs=jobs,
+                         progress=handle._progress)
+
+        handle.future = tree._background_executor().submit(remove)
+        return handle
+
+    @staticmethod
+    def _rmtree_onerror(ignore_errors, onerror):
+        def _onerror(func, path, exc_info):
+            if ignore_errors:
+                return
+            elif onerror is not None:
+                onerror(func, path, exc_info)
+            else:
+                raise exc_info[1]
+
+        return _onerror
+
     def chdir(self):
         os.chdir(self)
 
@@ -750,13 +1134,7 @@ class AugmentedPath(pathlib.Path):
         if self.is_dir():
             return 'inode/directory'  # matches _magic_mimetype
 
-        if not self.is_absolute():  # needed for safe as_uri
-            if self.is_broken_symlink():
-                self = self.absolute()
-            else:
-                self = self.resolve()
-
-        mime, encoding = mimetypes.guess_type(self.as_uri())
+        mime, encoding = self._guess_type()
         if mime:
             return mime
         elif hasattr(self, '_suffix_mimetypes') and self._suffix_mimetypes:
@@ -767,52 +1145,50 @@ class AugmentedPath(pathlib.Path):
 
     @property
     def encoding(self):
-        if not self.is_absolute():  # needed for safe as_uri
-            self = self.resolve()
-
-        mime, encoding = mimetypes.guess_type(self.as_uri())
+        mime, encoding = self._guess_type()
         if encoding:
             return encoding
 
+    def _guess_type(self):
+        # only the name matters, the leading slash keeps names
+        # like data:... from being parsed as a url scheme
+        return mimetypes.guess_type('/' + self.name)
+
     @property
     def _magic_mimetype(self):
         """ This can be slow because it has to open the files. """
         if self.exists():
-            try:
-                if hasattr(magic, 'detect_from_filename'):
-                    # sys-apps/file python-magic api
-                    return magic.detect_from_filename(self).mime_type
-                else:
-                    # python-magic
-                    return magic.from_file(self.as_posix(), mime=True)
-            except NameError as e:
-                if not _have_magic:
-                    msg = ('no module magic found from either python-magic '
-                           'or from libmagic python bindings')
-                    raise ModuleNotFoundError(msg) from e
-                else:
-                    raise e
+            return mime.magic_mimetype(self)
+
+    def _resolve_cypher(self, cypher=default_cypher):
+        if cypher != default_cypher:
+            pass  # FIXME this is SO DUMB (see commit message)
+        elif ((hasattr(self, '_cache_class') and
+             hasattr(self._cache_class, 'cypher') and
+             self._cache_class.cypher != cypher)):  # FIXME this could be static ...
+            cypher = self._cache_class.cypher
 
-    def checksum(self, cypher=default_cypher, extra_cyphers=tuple()):
+        elif (hasattr(self, 'cypher') and
+              self.cypher != cypher):
+            cypher = self.cypher
+
+        return cypher
+
+    def checksum(self, cypher=default_cypher, extra_cyphers=tuple(), zero_copy=False):
         """ checksum() always recomputes from the data
-            meta.checksum is static for cache and remote IF it exists """
+            meta.checksum is static for cache and remote IF it exists
+
+            zero_copy=True reads via data_views if the class has it """
         # FIXME the cypher cannot be determined independent of a call to checksum
 
         if self.is_file():
-            if cypher != default_cypher:
-                pass  # FIXME this is SO DUMB (see commit message)
-            elif ((hasattr(self, '_cache_class') and
-                 hasattr(self._cache_class, 'cypher') and
-                 self._cache_class.cypher != cypher)):  # FIXME this could be static ...
-                cypher = self._cache_class.cypher
-
-            elif (hasattr(self, 'cypher') and
-                  self.cypher != cypher):
-                cypher = self.cypher
-
+            cypher = self._resolve_cypher(cypher)
             m = cypher()
             extra = [c() for c in extra_cyphers]
-            for chunk in self.data:
+            data = (self.data_views()
+                    if zero_copy and hasattr(self, 'data_views') else
+                    self.data)
+            for chunk in data:
                 m.update(chunk)
                 for me in extra:
                     me.update(chunk)
@@ -1059,6 +1435,10 @@ class LocalPath(EatPath, AugmentedPath):
         if anchor:
             cache.anchorClassHere()
 
+        if anchor or self.is_dir():
+            # only directories can become roots
+            invalidate_cache_roots()
+
         return cache
 
     def mkdir_cache(self, remote):  # XXX hack around my idiocy / desire to not hit the network
@@ -1125,10 +1505,40 @@ class LocalPath(EatPath, AugmentedPath):
             raise FileNotFoundError('missing parent for {self} and parents=False')
 
     def find_cache_root(self, fail=False):
-        """ find the local root of the cache tree, even if we start with skips """
+        """ find the local root of the cache tree, even if we start with skips
+
+            the root is always absolute even if self is relative
+
+            results for directories are memoized process wide, the index is
+            cleared by cache_init, anchorClassHere, and weighAnchor, if caches
+            are created above an existing root some other way then call
+            invalidate_cache_roots, files share the root of their parent """
         if self.is_broken_symlink():
             return self.parent.find_cache_root(fail=fail)
 
+        if not self.is_dir():
+            root = self.parent.find_cache_root(fail=fail)
+            if root is not None:
+                return root
+
+            root = self._find_cache_root(fail=fail)
+            return None if root is None else root.absolute()
+
+        key = self._cache_class, os.fspath(self.absolute())
+        try:
+            return _cache_roots[key]
+        except KeyError:
+            pass
+
+        root = self._find_cache_root(fail=fail)
+        if root is not None:  # no root yet may change without an anchor
+            # relative and absolute callers share the key so the
+            # stored root has to be absolute for both of them
+            root = _cache_roots[key] = root.absolute()
+
+        return root
+
+    def _find_cache_root(self, fail=False):
         found_cache = None
         # try all the variants in case some symlinking weirdness is going on
         # TODO may want to detect and warn on that?
@@ -1161,9 +1571,8 @@ class LocalPath(EatPath, AugmentedPath):
             if parent_cache:
                 rel_path = self.relative_to(parent_cache.anchor)
             else:
-                # FIXME is it safe to cache the results of finding the root??
                 root = self.find_cache_root(fail=True)
-                rel_path = self.relative_to(root)
+                rel_path = self.absolute().relative_to(root)
             return (rel_path.parts[0] in self._cache_class.cache_ignore or
                     # TODO more conditions
                     False)
@@ -1193,6 +1602,11 @@ class LocalPath(EatPath, AugmentedPath):
         """ sometimes python just doesn't have what it takes """
         # we can't define this or use error trapping in self.stat() directly
         # because it will bolox other things that need stat to fail correctly
+        try:
+            return statx.statx(self)
+        except NotImplementedError:
+            pass
+
         cmd = ['stat', self.as_posix(), '-c', StatResult.stat_format]
         p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         out, errs = p.communicate()
@@ -1208,6 +1622,12 @@ class LocalPath(EatPath, AugmentedPath):
     def size(self):
         """ don't use this to populate meta, but meta computes a checksum
             so if you need anything less than the checksum don't get meta """
+        snap = self._snapshot()
+        if snap is not None:
+            st = snap.stat(self)
+            if st is not None:
+                return st.st_size
+
         try:
             st = self.stat()
         except OSError as e:
@@ -1215,6 +1635,103 @@ class LocalPath(EatPath, AugmentedPath):
 
         return st.st_size
 
+    # the memo is keyed on st_ctime_ns as well as size and mtime_ns so
+    # that rewrites that restore mtime (rsync --inplace -t, touch -d)
+    # are caught, an xattr on the file cannot hold such a key because
+    # writing it bumps st_ctime, so the memo lives in a mapping instead
+    # set checksum_memo_store to a persistent mapping e.g. a dbm or a
+    # shelve to share it across processes, None uses a bounded in
+    # process lru that is shared by all instances
+    memoize_checksums = False
+    checksum_memo_store = None
+    _checksum_memo_lru = None
+    _checksum_memo_lru_max = 65536
+
+    @staticmethod
+    def _stat_unchanged(st, new):
+        return ((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns) ==
+                (new.st_dev, new.st_ino, new.st_size, new.st_mtime_ns, new.st_ctime_ns))
+
+    def _checksum_memo(self):
+        store = self.checksum_memo_store
+        if store is None:
+            cls = LocalPath
+            if cls._checksum_memo_lru is None:
+                cls._checksum_memo_lru = _LruMemo(cls._checksum_memo_lru_max)
+
+            store = cls._checksum_memo_lru
+
+        return store
+
+    @staticmethod
+    def _checksum_memo_key(cypher, st):
+        return (f'{st.st_dev} {st.st_ino} {st.st_size} '
+                f'{st.st_mtime_ns} {st.st_ctime_ns} {cypher_algo[cypher]}')
+
+    def _checksum_memo_ok(self, cypher, st):
+        return (self.memoize_checksums and
+                S_ISREG(st.st_mode) and
+                cypher in cypher_algo and
+                # not StatResult or StatxResult from _stat, if os.stat
+                # failed then the stat in _checksum_memo_set will too
+                isinstance(st, os.stat_result))
+
+    def _checksum_memo_get(self, cypher, st):
+        """ return the memoized checksum or None """
+        return self._checksum_memo().get(self._checksum_memo_key(cypher, st))
+
+    def _checksum_memo_set(self, cypher, st, checksum):
+        """ st must be from before the checksum was computed """
+        if not self._stat_unchanged(st, self.stat()):
+            return  # file changed while we were reading it
+
+        self._checksum_memo()[self._checksum_memo_key(cypher, st)] = checksum
+
+    def _checksum_memoized(self, cypher=default_cypher, st=None):
+        """ checksum that is memoized on the identity of the file
+            if memoize_checksums is set so that unchanged files cost a
+            stat and a lookup instead of a full read """
+
+        cypher = self._resolve_cypher(cypher)
+        if st is None:
+            st = self.stat()
+
+        if not self._checksum_memo_ok(cypher, st):
+            return self.checksum(cypher)
+
+        checksum = self._checksum_memo_get(cypher, st)
+        if checksum is None:
+            checksum = self.checksum(cypher)
+            self._checksum_memo_set(cypher, st, checksum)
+
+        return checksum
+
+    def digests(self, cypher=default_cypher, extra_cyphers=tuple(), etag_chunksize=None):
+        """ read the file once and feed every chunk to the checksum
+            cypher, any extra_cyphers, and the multipart etag if an
+            etag_chunksize is provided
+
+            returns (checksum, extra_digests, etag) where etag is None
+            if no etag_chunksize was provided, cypher resolution is the
+            same as for checksum() """
+
+        if not self.is_file():
+            return None, tuple(), None
+
+        cypher = self._resolve_cypher(cypher)
+        hashers = [cypher()] + [c() for c in extra_cyphers]
+        m = etag(etag_chunksize) if etag_chunksize else None
+        updates = [h.update for h in hashers]
+        if m is not None:
+            updates.append(m.update)
+
+        for chunk in self.data_views():
+            for update in updates:
+                update(chunk)
+
+        checksum, *extra = [h.digest() for h in hashers]
+        return checksum, tuple(extra), (None if m is None else m.digest())
+
     @property
     def meta(self):
         return self._meta_maker()
@@ -1236,9 +1753,7 @@ class LocalPath(EatPath, AugmentedPath):
             st = self._stat()
 
         # FIXME nanos vs millis ??
-        change_tuple = (fs_metadata_changed_time,
-                        fs_data_modified_time) = (st.st_ctime,
-                                                  st.st_mtime)
+        change_tuple = (st.st_ctime, st.st_mtime)
 
         if hasattr(self, '_meta') and self._meta is not None:
             if self.__change_tuple == change_tuple:
@@ -1246,6 +1761,27 @@ class LocalPath(EatPath, AugmentedPath):
 
             old_meta = self._meta  # TODO log changes?
 
+        cypher = (  # FIXME hack around terrible design
+            self._cache_class.cypher
+            if self._cache_class and self._cache_class.cypher
+            else default_cypher)  # FIXME doesn't handle the case where the checksum may differ per file
+        etag_ = None
+        if checksum and chunksize:
+            # one read for both
+            cypher = self._resolve_cypher(cypher)
+            checksum, _, etag_ = self.digests(cypher, etag_chunksize=chunksize)
+            if checksum is not None and self._checksum_memo_ok(cypher, st):
+                self._checksum_memo_set(cypher, st, checksum)
+        elif checksum:
+            checksum = self._checksum_memoized(cypher, st)
+        else:
+            checksum = None
+            if chunksize:
+                etag_ = self.etag(chunksize)
+
+        change_tuple = (fs_metadata_changed_time,
+                        fs_data_modified_time) = (st.st_ctime,
+                                                  st.st_mtime)
 
         self.__change_tuple = change_tuple  # TODO log or no?
 
@@ -1273,11 +1809,6 @@ class LocalPath(EatPath, AugmentedPath):
         # replace with comma since it is conformant to the standard _and_
         # because it simplifies PathMeta as_path
         mode = oct(st.st_mode)
-        cypher = (  # FIXME hack around terrible design
-            self._cache_class.cypher
-            if self._cache_class and self._cache_class.cypher
-            else default_cypher)  # FIXME doesn't handle the case where the checksum may differ per file
-        checksum = self.checksum(cypher) if checksum else None
         checksum_cypher = cypher_algo[cypher] if checksum else None
         self._meta = PathMeta(name=self.name,
                               size=st.st_size,
@@ -1285,7 +1816,7 @@ class LocalPath(EatPath, AugmentedPath):
                               updated=updated,
                               checksum=checksum,
                               checksum_cypher=checksum_cypher,
-                              etag=self.etag() if chunksize else None,
+                              etag=etag_,
                               chunksize=chunksize,
                               parent_id=self.parent_id,
                               id=self.id,
@@ -1304,40 +1835,22 @@ class LocalPath(EatPath, AugmentedPath):
         raise TypeError('Cannot set meta on LocalPath, it is a source of metadata.')
 
     def _data(self, ranges=tuple(), chunksize=None):
-        """ request arbitrary subsets of data from an object """
+        """ request arbitrary subsets of data from an object
+
+            ranges are (start, end) pairs with slice semantics so
+            (-100, None) is the last 100 bytes, the data for each range
+            is yielded in request order in pieces of at most chunksize,
+            see ranges for how reads are coalesced and how files without
+            a meaningful size such as those in /proc are handled """
 
         if chunksize is None:
             chunksize = self.chunksize
 
-        with open(self, 'rb') as f:
-            if not ranges:
-                ranges = (0, None),
-            else:
-                # TODO validate ranges
-                pass
-
-            for start, end in ranges:
-                f.seek(start, 2 if start < 0 else 0)
-                if end is not None:
-                    total = end - start
-                    if total < chunksize:
-                        nchunks = 0
-                        last_chunksize = total
-                    elif total > chunksize:
-                        nchunks, last_chunksize = divmod(total, chunksize)
-
-                    for _ in range(nchunks):  # FIXME boundscheck ...
-                        yield f.read(chunksize)
+        if not ranges:
+            ranges = (0, None),
 
-                    yield f.read(last_chunksize)
-
-                else:
-                    while True:
-                        data = f.read(chunksize)  # TODO hinting
-                        if not data:
-                            break
-
-                        yield data
+        with open(self, 'rb', buffering=0) as f:
+            yield from ranges_.read_ranges(f.fileno(), ranges, chunksize)
 
     @property
     def data(self):
@@ -1349,11 +1862,77 @@ class LocalPath(EatPath, AugmentedPath):
 
                 yield data
 
+    _stream_chunksize_max = 1024 ** 2
+
+    def _stream_chunksize(self, st):
+        """ a multiple of the block size big enough to keep the number of
+            reads per file low but small enough to stay in cache, files
+            smaller than the max are read in a single chunk """
+        blksize = getattr(st, 'st_blksize', None) or self.chunksize
+        target = max(min(st.st_size, self._stream_chunksize_max), 1)
+        return -(-target // blksize) * blksize  # round up to a whole block
+
+    def data_views(self, chunksize=None, mmap=False):
+        """ zero copy alternative to data, yields memoryviews
+
+            WARNING each view is only valid until the next one is requested
+            after which it is released and the underlying buffer is reused,
+            consume (hash, write, etc.) or copy each chunk before continuing
+
+            mmap=True maps the file instead of reading into a buffer,
+            only regular files can be mapped, anything else falls back
+            to reading into a buffer """
+
+        with open(self, 'rb', buffering=0) as f:
+            st = os.fstat(f.fileno())
+            if chunksize is None:
+                chunksize = self._stream_chunksize(st)
+
+            if mmap and S_ISREG(st.st_mode) and st.st_size:
+                yield from self._data_views_mmap(f, chunksize)
+                return
+
+            buffer = memoryview(bytearray(chunksize))
+            try:
+                while True:
+                    size = f.readinto(buffer)
+                    if not size:
+                        break
+
+                    view = buffer[:size]
+                    try:
+                        yield view
+                    finally:
+                        view.release()
+            finally:
+                buffer.release()
+
+    @staticmethod
+    def _data_views_mmap(f, chunksize):
+        import mmap
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mm, 'madvise'):  # >= 3.8
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+
+        buffer = memoryview(mm)
+        try:
+            for start in range(0, len(mm), chunksize):
+                view = buffer[start:start + chunksize]
+                try:
+                    yield view
+                finally:
+                    view.release()
+        finally:
+            buffer.release()
+            mm.close()
+
     def _write_chunks_ntfs(self, generator):
         # SO. It turns out that open(thing, 'wb') has fundamentally different
         # semantics on posix and windows (wheeeeeeeeeee!) on posix it keeps
         # xattrs intact, on windows it erases them AAAAAAAAAAAAAAAAAAAAAAA
-        chunk1 = next(generator)  # if an error occurs don't open the file FIXME I think this might be causing the zero size files?
+        # if an error occurs don't open the file, no chunks is an empty file
+        generator = iter(generator)
+        chunk1 = next(generator, b'')  # FIXME I think this might be causing the zero size files?
         with open(self, 'ab') as f:
             f.seek(0)
             f.truncate()
@@ -1363,7 +1942,9 @@ class LocalPath(EatPath, AugmentedPath):
                 f.write(chunk)
 
     def _write_chunks_posix(self, generator):
-        chunk1 = next(generator)  # if an error occurs don't open the file FIXME I think this might be causing the zero size files?
+        # if an error occurs don't open the file, no chunks is an empty file
+        generator = iter(generator)
+        chunk1 = next(generator, b'')  # FIXME I think this might be causing the zero size files?
         with open(self, 'wb') as f:
             f.write(chunk1)
             for chunk in generator:
@@ -1373,8 +1954,142 @@ class LocalPath(EatPath, AugmentedPath):
     _write_chunks = (
         _write_chunks_ntfs if os.name == 'nt' else _write_chunks_posix)
 
+    # opt in to writing via a temporary sibling that is renamed into
+    # place so that a failed write never leaves a partial or empty file
+    data_atomic = False
+    # none  no fsync, the rename is atomic but may not survive a crash
+    # file  fsync the data before the rename
+    # full  also fsync the parent directory after the rename
+    data_durabilities = ('none', 'file', 'full')
+    data_durability = 'file'
+
+    def _write_chunks_atomic(self, generator, size=None, verify=None):
+        """ stream generator into a hidden sibling preallocated to size
+            if known, carry over the mode and user xattrs of the current
+            file if there is one, then os.replace it over self, symlinks
+            are followed so the file they point to is the one replaced
+
+            verify() is called once all chunks are written and may raise
+            to abandon the write before anything is replaced """
+
+        if self.data_durability not in self.data_durabilities:
+            msg = f'unknown durability {self.data_durability!r} not in {self.data_durabilities}'
+            raise ValueError(msg)
+
+        # plain fspaths so that subclasses with extra init arguments work
+        dest = os.path.realpath(self) if self.is_symlink() else os.fspath(self)
+        parent, name = os.path.split(dest)
+        parent = parent or os.curdir
+        # if an error occurs don't open the file, no chunks is an empty file
+        generator = iter(generator)
+        chunk1 = next(generator, b'')
+        temp = os.path.join(parent, f'.{name}.write-{uuid4().hex}')
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                     getattr(os, 'O_CLOEXEC', 0) | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            with open(fd, 'wb', closefd=True) as f:
+                if size and hasattr(os, 'posix_fallocate'):
+                    try:
+                        os.posix_fallocate(fd, 0, int(size))
+                    except OSError as e:
+                        if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+                            raise e
+
+                f.write(chunk1)
+                for chunk in generator:
+                    f.write(chunk)
+
+                f.flush()
+                os.ftruncate(fd, f.tell())  # in case size was wrong
+                if verify is not None:
+                    verify()
+
+                try:
+                    st = os.stat(dest)
+                except FileNotFoundError:
+                    pass
+                else:
+                    os.chmod(fd if os.chmod in os.supports_fd else temp, st.st_mode & 0o7777)
+                    if os.name != 'nt':
+                        try:
+                            xattrs = xattr.get_all(dest, namespace=XATTR_DEFAULT_NS)
+                        except OSError as e:
+                            if e.errno != errno.EOPNOTSUPP:
+                                raise e
+
+                            xattrs = []
+
+                        for k, v in xattrs:
+                            xattr.set(fd, k, v, namespace=XATTR_DEFAULT_NS)
+
+                if self.data_durability != 'none':
+                    os.fsync(fd)
+
+            os.replace(temp, dest)
+        except BaseException as e:
+            try:
+                os.unlink(temp)
+            except FileNotFoundError:
+                pass
+
+            raise e
+
+        if self.data_durability == 'full' and os.name != 'nt':
+            dfd = os.open(parent, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dfd)
+            finally:
+                os.close(dfd)
+
     @data.setter
     def data(self, generator):
+        self._data_write(generator, atomic=self.data_atomic)
+
+    def write_verified(self, generator, size=None, checksum=None, cypher=default_cypher,
+                       etag=None, etag_chunksize=None):
+        """ write generator as the data setter does but always via a
+            temporary sibling and hash the chunks on their way to disk
+
+            if the number of bytes written does not match size, or the
+            digest does not match checksum or etag (digest, count) then
+            exc.SizeError or exc.ChecksumError is raised before the
+            rename and self is left as it was, None skips that check
+
+            returns (checksum, etag) of the data that was written,
+            etag is only computed if etag_chunksize is provided """
+
+        if etag is not None and etag_chunksize is None:
+            raise TypeError('etag requires etag_chunksize')
+
+        m = self._resolve_cypher(cypher)()
+        e = aug.etag(etag_chunksize) if etag_chunksize else None  # etag is shadowed
+        written = [0]
+
+        def tee():
+            for chunk in generator:
+                written[0] += len(chunk)
+                m.update(chunk)
+                if e is not None:
+                    e.update(chunk)
+
+                yield chunk
+
+        def verify():
+            if size is not None and written[0] != size:
+                raise exc.SizeError(f'{written[0]} != {size} for {self}')
+
+            if checksum is not None and m.digest() != checksum:
+                msg = f'{m.digest().hex()!r} != {checksum.hex()!r} for {self}'
+                raise exc.ChecksumError(msg)
+
+            if etag is not None and e.digest() != tuple(etag):
+                msg = f'{e.hexdigest()!r} != {etag[0].hex()}-{etag[1]} for {self}'
+                raise exc.ChecksumError(msg)
+
+        self._data_write(tee(), atomic=True, verify=verify)
+        return m.digest(), (None if e is None else e.digest())
+
+    def _data_write(self, generator, atomic=False, verify=None):
         cache = self.cache
         if cache is not None:
             cmeta = cache.meta
@@ -1389,7 +2104,14 @@ class LocalPath(EatPath, AugmentedPath):
         # especially when updating a file ...
         # storing history in the symlink cache also an option?
         log.debug(f'writing to {self}')
-        self._write_chunks(generator)
+        self.invalidate_stat()
+        if atomic:
+            size = cmeta.size if cache is not None and cmeta else None
+            self._write_chunks_atomic(generator, size, verify)
+            self.invalidate_stat()
+        else:
+            self._write_chunks(generator)
+
         if cache is not None:  # FIXME cache
             if not cache.meta:
                 # XXX FIXME when this fails to set things downstream fail as well
@@ -1406,8 +2128,13 @@ class LocalPath(EatPath, AugmentedPath):
         # FIXME if the generator can silently fail that is very very bad news ...
         # but how/why would they be silently failing ??!
         log.debug(f'writing to {self}')
-        chunk1 = next(generator)  # if an error occurs don't open the file
+        generator = iter(generator)
+        chunk1 = next(generator, None)  # if an error occurs don't open the file
+        self.invalidate_stat()
         with open(self, 'ab' if append else 'wb') as f:
+            if chunk1 is None:  # no chunks still creates or truncates
+                return
+
             f.write(chunk1)
             yield chunk1
             for chunk in generator:
@@ -1415,13 +2142,29 @@ class LocalPath(EatPath, AugmentedPath):
                 f.write(chunk)
                 yield chunk
 
+    # open(path, 'wb') clears alternate data streams on windows
+    fast_copy = os.name != 'nt'
+
     def copy_to(self, target, force=False, copy_cache_meta=False):
-        """ copy from a the current path object to a target path """
+        """ copy from a the current path object to a target path
+
+            if the target has no cache then the copy is done in the
+            kernel when possible see fastcopy, otherwise the data setter
+            is used so that the cache meta is handled when writing """
         if type(target) != type(self):
             target = self.__class__(target)
 
         if not target.exists() and not target.is_symlink() or force:
-            target.data = self.data
+            if self.fast_copy and target.cache is None:
+                target.invalidate_stat()
+                method = fastcopy.copyfile(self, target)
+                log.debug(f'copied {self} -> {target} via {method}')
+            elif type(target).data.fset is LocalPath.data.fset:
+                # our writer consumes each chunk before asking for the next
+                # so it can take views, an overridden setter may keep them
+                target._data_write(self.data_views(), atomic=target.data_atomic)
+            else:
+                target.data = self.data
         else:
             raise exc.PathExistsError(f'{target}')
 
@@ -1429,6 +2172,66 @@ class LocalPath(EatPath, AugmentedPath):
             log.debug(f'copying cache meta {self.cache.meta}')
             target.cache_init(self.cache.meta)
 
+    def copy_tree(self, target, force=False, copy_cache_meta=False, jobs=None):
+        """ copy the directory tree at the current path to target
+
+            yields (source, target, error) for every path in the tree as
+            it finishes, error is None on success, errors do not stop the
+            copy but a path under a directory that failed will also fail
+
+            directories are created by the calling thread as the tree is
+            listed and before any of their contents are queued, files are
+            copied with copy_to on a pool of jobs threads, symlinks are
+            recreated as symlinks with the same (possibly broken) target """
+
+        if type(target) != type(self):
+            target = self.__class__(target)
+
+        if not self.is_dir():
+            raise NotADirectoryError(f'{self} is not a directory')
+
+        if (target.exists() or target.is_symlink()) and not force:
+            raise exc.PathExistsError(f'{target}')
+
+        def mkdir(dest):
+            try:
+                dest.mkdir(exist_ok=force)
+            except OSError as e:
+                return e
+
+        def items():
+            yield self, target, mkdir(target)
+            for directory, children in tree.scandir_parallel(
+                    self, jobs=jobs, order='topdown', cache=True):
+                tdir = target / directory.relative_to(self)
+                for child in children:
+                    dest = tdir / child.name
+                    if child.is_dir() and not child.is_symlink():
+                        yield child, dest, mkdir(dest)
+                    else:
+                        yield child, dest, None
+
+        def copy(item):
+            source, dest, error = item
+            if error is not None or source.is_dir() and not source.is_symlink():
+                return error
+
+            try:
+                if source.is_symlink():
+                    if force and (dest.exists() or dest.is_symlink()):
+                        dest.unlink()
+
+                    dest.symlink_to(source.readlink(raw=True),
+                                    target_is_directory=source.is_dir())
+                else:
+                    source.copy_to(dest, force=force, copy_cache_meta=copy_cache_meta)
+            except Exception as e:
+                return e
+
+        for (source, dest, _), error in bounded_imap_unordered(copy, items(), jobs=jobs):
+            source.invalidate_stat()  # don't hand out the DirEntry
+            yield source, dest, error
+
     def copy_from(self, source, force=False, copy_cache_meta=False):
         """ copy from a source path to the current path object """
         if type(source) != type(self):
@@ -1438,6 +2241,10 @@ class LocalPath(EatPath, AugmentedPath):
 
     @property
     def children(self):
+        yield from self._children()
+
+    def _children(self, cache=False):
+        """ children, cache is the same as for scandir """
         if self.is_dir():
             if (self.cache is not None and
                 # relative paths inside may have a cache but no anchor
@@ -1449,28 +2256,80 @@ class LocalPath(EatPath, AugmentedPath):
                 # implemented this way we can still use Path to navigate
                 # once we are inside local data dir, though all files there
                 # are skip_cache -> True
-                for path in self.iterdir():
+                for path in self.scandir(cache=cache):
                     if path.stem in cache_ignore:
                         continue
 
                     yield path
             else:
-                yield from self.iterdir()
+                yield from self.scandir(cache=cache)
+
+    rchildren_jobs = 1  # set > 1 or None for high latency file systems
+    rchildren_order = 'unordered'  # see tree.orders
 
     @property
     def rchildren(self):
+        yield from self._rchildren()
+
+    def _rchildren(self, cache=False):
+        """ rchildren, cache is the same as for scandir """
         if (self.is_dir() and self.cache is not None and
             # relative paths inside may have a cache but no anchor
             # the anchor itself can be relative and have an anchor
             # so we test to see if there is an anchor first
             self.cache.anchor and
             self == self.cache.anchor.local):
-            for path in self.children:
+            for path in self._children(cache=cache):
                 yield path
-                yield from path.rchildren
+                yield from path._rchildren(cache=cache)
+
+        elif self.is_dir():
+            yield from self.rscandir(jobs=self.rchildren_jobs,
+                                     order=self.rchildren_order,
+                                     cache=cache)
+
+    # asyncio, see aio, imported on first use since asyncio is slow to import
+
+    def adata(self, chunksize=None):
+        """ async generator version of data """
+        from augpathlib import aio
+        return aio.adata(self, chunksize)
 
+    def awrite_data(self, chunks):
+        """ awaitable version of the data setter, chunks may be async """
+        from augpathlib import aio
+        return aio.awrite_data(self, chunks)
+
+    def ameta(self):
+        from augpathlib import aio
+        return aio.ameta(self)
+
+    def achecksum(self, cypher=default_cypher, extra_cyphers=tuple()):
+        from augpathlib import aio
+        return aio.achecksum(self, cypher, extra_cyphers)
+
+    def archildren(self, batch=64):
+        """ async generator version of rchildren """
+        from augpathlib import aio
+        return aio.archildren(self, batch)
+
+    def checksum_tree(self, cypher=default_cypher, extra_cyphers=tuple(), jobs=None):
+        """ checksum every file in rchildren on a pool of threads
+
+            yields (path, digest) pairs in the order that they complete
+            not in the order of rchildren, digest is whatever checksum()
+            returns for the same arguments so cypher resolution and
+            extra_cyphers behave exactly as they do for single files """
+
+        if self.is_file():
+            paths = self,
         else:
-            yield from self.rglob('*')
+            paths = (path for path in self.rchildren if path.is_file())
+
+        def checksum(path):
+            return path.checksum(cypher, extra_cyphers)
+
+        yield from bounded_imap_unordered(checksum, paths, jobs=jobs)
 
     def content_different(self):
         cmeta = self.cache.meta
@@ -1481,7 +2340,8 @@ class LocalPath(EatPath, AugmentedPath):
             # but for now just pull down the remote file
             # NOTE: this is all handled behind the scenes
             # by cache.checksum now
-            return self.checksum() != self.cache.checksum()
+            checksum = self._checksum_memoized()
+            return checksum != self.cache.checksum()
 
     def diff(self):
         """ This is a bit tricky because it means that we need to
@@ -1514,21 +2374,40 @@ class LocalPath(EatPath, AugmentedPath):
         self.remote.data = self.data
         self.remote.annotations = self.annotations
 
-    def etag(self, chunksize):
+    def etag(self, chunksize, zero_copy=False, jobs=1):
         """ chunksize is the etag cypher chunksize which is
             different than the data generator chunksize
             etag chunksize has be implemented so that it
-            works correctly with any data generator chunksize """
+            works correctly with any data generator chunksize
+
+            jobs other than 1 digests the parts concurrently, each
+            thread reads its own disjoint range of the file """
 
         if self.is_file():
+            if jobs != 1:
+                parts = etag.part_ranges(self.size, chunksize)
+                if len(parts) > 1:
+                    return self._etag_parallel(parts, jobs)
+
             m = etag(chunksize)
-            for chunk in self.data:
+            for chunk in (self.data_views() if zero_copy else self.data):
                 m.update(chunk)
 
             return m.digest()
 
         return
 
+    def _etag_parallel(self, parts, jobs):
+        def part_digest(part):
+            m = etag.cypher()
+            for chunk in self._data(ranges=(part,), chunksize=self._stream_chunksize_max):
+                m.update(chunk)
+
+            return m.digest()
+
+        digests = dict(bounded_imap_unordered(part_digest, parts, jobs=jobs))
+        return etag.from_part_digests([digests[part] for part in parts])
+
 
 LocalPath._bind_flavours()
 
@@ -0,0 +1,216 @@
+""" kernel assisted file copies
+
+in order of preference
+clone             FICLONE reflink, shares extents, btrfs xfs etc.
+copy_file_range   in kernel copy, server side copy on nfs 4.2 etc.
+sendfile          in kernel copy between two fds
+readinto          user space copy into a reused buffer
+
+each is tried in turn and any errno that indicates that the method is
+not supported for this pair of files falls through to the next one,
+holes in sparse files are found with SEEK_DATA/SEEK_HOLE and skipped
+
+files that are not regular files or that report a size of zero
+(/proc, sysfs, fifos, etc.) are read until they run out instead
+since the kernel methods copy nothing for them """
+
+import os
+import sys
+import errno
+from stat import S_ISREG
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+
+_fallthrough = frozenset(getattr(errno, name) for name in (
+    'EXDEV',       # different file systems on older kernels
+    'ENOSYS',      # no such syscall
+    'EOPNOTSUPP',
+    'ENOTSUP',
+    'ENOTTY',      # ioctl not supported by the file system
+    'EINVAL',      # file system or file type does not support it
+    'EBADF',       # e.g. target opened with O_APPEND
+    'EPERM',       # e.g. immutable or a seal
+    'ETXTBSY',
+) if hasattr(errno, name))
+
+_buffer_size = 1024 ** 2
+
+
+def _fall(e):
+    return e.errno in _fallthrough
+
+
+def _clone(infd, outfd):
+    if sys.platform != 'linux':
+        return False
+
+    import fcntl
+    try:
+        fcntl.ioctl(outfd, FICLONE, infd)
+        return True
+    except OSError as e:
+        if not _fall(e):
+            raise e
+
+        return False
+
+
+def _copy_file_range(infd, outfd, offset, length):
+    """ returns the number of bytes copied, raises OSError on failure """
+    done = 0
+    while done < length:
+        n = os.copy_file_range(infd, outfd, length - done,
+                               offset + done, offset + done)
+        if not n:  # source shrank
+            break
+
+        done += n
+
+    return done
+
+
+def _sendfile(infd, outfd, offset, length):
+    os.lseek(outfd, offset, os.SEEK_SET)
+    done = 0
+    while done < length:
+        n = os.sendfile(outfd, infd, offset + done, length - done)
+        if not n:
+            break
+
+        done += n
+
+    return done
+
+
+def _readinto(infd, outfd, offset, length):
+    buffer = memoryview(bytearray(min(max(length, 1), _buffer_size)))
+    done = 0
+    while done < length:
+        n = os.preadv(infd, [buffer[:length - done]], offset + done)
+        if not n:
+            break
+
+        view = buffer[:n]
+        while view:
+            written = os.pwrite(outfd, view, offset + done)
+            view = view[written:]
+            done += written
+
+    return done
+
+
+_methods = tuple((name, function) for name, function in (
+    ('copy_file_range', _copy_file_range if hasattr(os, 'copy_file_range') else None),
+    ('sendfile', _sendfile if hasattr(os, 'sendfile') and sys.platform == 'linux' else None),
+    ('readinto', _readinto if hasattr(os, 'preadv') else None),
+) if function is not None)
+
+
+def _copy_range(infd, outfd, offset, length, methods):
+    """ copy one range trying each method in turn, methods that are
+        not supported are removed from methods so they are not retried
+        for the other ranges of the same file, a method that fails part
+        way through is fine to restart since all of them write at
+        explicit offsets """
+    while methods:
+        name, function = methods[0]
+        try:
+            function(infd, outfd, offset, length)
+            return name
+        except OSError as e:
+            if not _fall(e):
+                raise e
+
+            methods.pop(0)
+
+    # windows and friends
+    os.lseek(infd, offset, os.SEEK_SET)
+    os.lseek(outfd, offset, os.SEEK_SET)
+    left = length
+    while left:
+        chunk = os.read(infd, min(left, _buffer_size))
+        if not chunk:
+            break
+
+        os.write(outfd, chunk)
+        left -= len(chunk)
+
+    return 'read'
+
+
+def _data_ranges(infd, size):
+    """ (offset, length) for each region that holds data
+        or None if the file system cannot tell us """
+    if not hasattr(os, 'SEEK_DATA'):
+        return None
+
+    ranges = []
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(infd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:  # only a hole remains
+                break
+            elif _fall(e):
+                return None
+
+            raise e
+
+        end = os.lseek(infd, start, os.SEEK_HOLE)
+        ranges.append((start, end - start))
+        offset = end
+
+    return ranges
+
+
+def _is_sparse(st):
+    blocks = getattr(st, 'st_blocks', None)
+    return blocks is not None and blocks * 512 < st.st_size
+
+
+def _stream(infd, outfd):
+    """ read infd until it ends without relying on its size """
+    while True:
+        chunk = os.read(infd, _buffer_size)
+        if not chunk:
+            break
+
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(outfd, view):]
+
+    return 'stream'
+
+
+def copyfd(infd, outfd, sparse=True):
+    """ copy the whole of infd over outfd which should be empty
+        returns the name of the method that copied the data """
+    st = os.fstat(infd)
+    if not S_ISREG(st.st_mode) or not st.st_size:
+        return _stream(infd, outfd)
+
+    if _clone(infd, outfd):
+        return 'clone'
+
+    methods = list(_methods)
+    size = st.st_size
+    ranges = _data_ranges(infd, size) if sparse and _is_sparse(st) else None
+    if ranges is None:
+        return _copy_range(infd, outfd, 0, size, methods)
+
+    name = 'hole'
+    for offset, length in ranges:
+        name = _copy_range(infd, outfd, offset, length, methods)
+
+    # trailing holes are not written so extend to the full size
+    os.ftruncate(outfd, size)
+    return name
+
+
+def copyfile(source, target, sparse=True):
+    """ copy the contents of source to target, target is created or
+        truncated, on posix the existing xattrs of target are kept,
+        no metadata is copied, returns the name of the method used """
+    with open(source, 'rb', buffering=0) as fsrc, open(target, 'wb', buffering=0) as fdst:
+        return copyfd(fsrc.fileno(), fdst.fileno(), sparse=sparse)
@@ -1,14 +1,13 @@
 """
 Classes for storing and converting metadata associated with path like objects.
 """
+import io
 import pickle
 import struct
 import pathlib
-from datetime import datetime
-from dateutil import parser as dateparser
-from terminaltables3 import AsciiTable
+from datetime import datetime, timedelta, timezone
 from augpathlib import exceptions as exc
-from augpathlib.utils import log, FileSize, red
+from augpathlib.utils import log, FileSize, red, AUG_XATTR_PREFIX
 
 
 def isoformat(datetime_instance, timespec='auto'):
@@ -23,17 +22,35 @@ def isoformat(datetime_instance, timespec='auto'):
             .replace('+00:00', 'Z'))
 
 
+def _pathmeta_from_kwargs(cls, kwargs):
+    """ unpickle helper, see PathMeta.__reduce__ """
+    return cls(**kwargs)
+
+
 class PathMeta:
     """ Internal representation that every other format converts through. """
 
     # TODO register xattr prefixes
 
-    @classmethod
-    def from_metastore(cls, blob, prefix=None):
-        """ db entry """
-        xattrs = pickle.loads(blob)
-        return cls.from_xattrs(xattrs, prefix)
-
+    # in the order that items() yields them, created and updated are last
+    _fields = ('name',
+               'size',
+               'checksum',
+               'checksum_cypher',
+               'etag',
+               'chunksize',
+               'multi',
+               'parent_id',
+               'id',
+               'file_id',
+               'old_id',
+               'gid',
+               'user_id',
+               'mode',
+               'errors',)
+
+    # slots instead of a __dict__ because we hold millions of these
+    __slots__ = _fields + ('_created', '_updated', '__kwargs')
 
     def __init__(self,
                  name=None,  # used to detect renames
@@ -57,18 +74,6 @@ class PathMeta:
 
         if not file_id and file_id is not None and file_id != 0:
             raise TypeError('wat')
-        if created is not None and not isinstance(created, int) and not isinstance(created, datetime):
-            _created = created
-        else:
-            self._created_ok = created
-            _created = None
-
-        if updated is not None and not isinstance(updated, int) and not isinstance(updated, datetime):
-            _updated = updated
-        else:
-            self._updated_ok = updated
-            _updated = None
-
         if id is not None and not isinstance(id, str):
             # no implicit type mutation, the system providing the ids
             # is where the information about how to do the converstion lives
@@ -77,8 +82,9 @@ class PathMeta:
 
         self.name = name  # XXX watch out for fields with arbitrary length e.g. dataset title
         self.size = size if size is None else FileSize(size)
-        self._created = _created
-        self._updated = _updated
+        # strings are kept as is until someone asks for the datetime
+        self._created = created
+        self._updated = updated
         self.checksum = checksum
         self.checksum_cypher = checksum_cypher
         self.etag = etag
@@ -101,19 +107,23 @@ class PathMeta:
         #embed()
         #return self._as_xattrs(self, prefix=prefix)
 
+    @staticmethod
+    def _parsed(value):
+        if value is not None and not isinstance(value, int) and not isinstance(value, datetime):
+            from dateutil import parser as dateparser  # slow import
+            value = dateparser.parse(value)
+
+        return value
+
     @property
     def created(self):
-        if not hasattr(self, '_created_ok'):
-            self._created_ok = dateparser.parse(self._created)
-
-        return self._created_ok
+        self._created = self._parsed(self._created)
+        return self._created
 
     @property
     def updated(self):
-        if not hasattr(self, '_updated_ok'):
-            self._updated_ok = dateparser.parse(self._updated)
-
-        return self._updated_ok
+        self._updated = self._parsed(self._updated)
+        return self._updated
 
     def content_different(self, other):
         """ is there any evidence that the file itself changed? """
@@ -124,53 +134,124 @@ class PathMeta:
             return (self.size != other.size or
                     self.updated < other.updated)
 
+    def _extra(self):
+        # subclasses without __slots__ may carry fields of their own
+        return [(k, v) for k, v in getattr(self, '__dict__', {}).items() if k[0] != '_']
+
+    def _field_items(self):
+        # everything but created and updated which may need parsing
+        return [(k, getattr(self, k)) for k in self._fields] + self._extra()
+
     def items(self):
-        out = [(k, v) for k, v in self.__dict__.items() if k[0] != '_']  # FIXME nonfields?
+        out = self._field_items()
         return out + [('created', self.created), ('updated', self.updated)]
         #for field in self.fields:
             #yield field, getattr(self, field)
 
-    def as_metastore(self, prefix=None):
-        # FIXME prefix= is a bad api ...
-        """ db entry """  # TODO json blob in sqlite? can it index?
-        return pickle.dumps(self.as_xattrs(prefix))
-
     def keys(self):
         yield from self
 
     def __getitem__(self, key):
         try:
-            getattr(self, key)
+            return getattr(self, key)
         except AttributeError as e:
             raise KeyError(key)
 
     def __iter__(self):
-        yield from (k for k in self.__dict__ if not k.startswith('_'))
+        yield from self._fields
+        yield from (k for k, v in self._extra())
+
+    def _kwargs(self):
+        """ the arguments to __init__ that reproduce self without
+            parsing any timestamps that have not been parsed yet """
+        kwargs = {k:v for k, v in self._field_items() if v is not None}
+        for field in ('created', 'updated'):
+            value = getattr(self, '_' + field)
+            if value is not None:
+                kwargs[field] = value
+
+        extra = getattr(self, '_PathMeta__kwargs', None)
+        if extra:
+            kwargs.update(extra)
+
+        return kwargs
 
     def __reduce__(self):
-        return (self.__class__, {k:v for k, v in self.items() if v is not None})
+        return (_pathmeta_from_kwargs, (self.__class__, self._kwargs()))
 
     def __repr__(self):
         _dict = {k:v for k, v in self.items() if not k.startswith('_')}
         return f'{self.__class__.__name__}({_dict})'
 
+    def _time_eq(self, other, field):
+        raw, other_raw = getattr(self, '_' + field), getattr(other, '_' + field)
+        if raw is not None and raw == other_raw:
+            return True  # don't parse if we don't have to
+
+        return getattr(self, field) == getattr(other, field)
+
     def __eq__(self, other):
         if isinstance(other, PathMeta):
-             for field, value in self.__dict__.items():
-                  if value != getattr(other, field):
-                       return False
-             else:
-                  return True
+            for field in self._fields:
+                if getattr(self, field) != getattr(other, field):
+                    return False
+
+            return (self._extra() == other._extra() and
+                    (getattr(self, '_PathMeta__kwargs', None) ==
+                     getattr(other, '_PathMeta__kwargs', None)) and
+                    self._time_eq(other, 'created') and
+                    self._time_eq(other, 'updated'))
+
+        return NotImplemented
+
+    __hash__ = None  # mutable, see FrozenPathMeta
 
     def __bool__(self):
-        for k, v in self.__dict__.items():
+        for k, v in self._field_items():
             if v is not None:
                 if k == 'errors' and not v:  # empty tuple ok
                     continue
 
                 return True
-        else:
-            return False
+
+        return self._created is not None or self._updated is not None
+
+
+class FrozenPathMeta(PathMeta):
+    """ Immutable and hashable PathMeta for use as a dict key or in sets.
+
+        Hashing parses created and updated so that metas that are
+        equal hash equal regardless of how their timestamps arrived. """
+
+    __slots__ = ('_frozen',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        object.__setattr__(self, '_frozen', True)
+
+    def __setattr__(self, name, value):
+        # parsing the timestamps is a cache not a change
+        if hasattr(self, '_frozen') and name not in ('_created', '_updated'):
+            raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __hash__(self):
+        return hash((self.__class__.__name__,
+                     *(v for k, v in self._field_items()),
+                     self.created,
+                     self.updated))
+
+    def thaw(self):
+        """ a mutable PathMeta with the same values """
+        return PathMeta(**self._kwargs())
+
+    @classmethod
+    def freeze(cls, pathmeta):
+        return cls(**pathmeta._kwargs())
 
 
 class _PathMetaConverter:
@@ -481,6 +562,8 @@ class _PathMetaAsXattrs(_PathMetaConverter):
               'mode',
               'errors')
 
+    reserved_prefix = (AUG_XATTR_PREFIX + '.').encode()
+
     def __init__(self):
         # register functionality on PathMeta
         def as_xattrs(self, prefix=None, _as_xattrs=self.as_xattrs):
@@ -520,6 +603,9 @@ class _PathMetaAsXattrs(_PathMetaConverter):
         else:
             decode = self.decode
 
+        # keys in the augpathlib namespace are bookkeeping not meta
+        xattrs = {k:v for k, v in xattrs.items()
+                  if not k.startswith(self.reserved_prefix)}
         if prefix:
             prefix += '.'
             kwargs = {k:decode(k, v)
@@ -621,6 +707,317 @@ class _PathMetaAsXattrs(_PathMetaConverter):
                 log.exception(f'{field} {value}')
                 raise e
 
+
+class _PathMetaAsPacked(_PathMetaAsXattrs):
+    """ Convert to and from a single packed bytes blob.
+
+        The blob is magic, a version byte, and then for each field
+        that has a value the index of the field in the version's field
+        list, the length of the value, and the value encoded exactly
+        as it would be for the per field xattrs, so decoding goes
+        through the same rules including path_object.decode_value. """
+
+    format_name = 'packed'
+    magic = b'apm'
+    header = struct.Struct('<BH')  # field index, value length
+    versions = {1: _PathMetaAsXattrs.fields}
+    version = 1
+
+    def __init__(self):
+        def as_packed(self, prefix=None, _as_packed=self.as_packed):
+            return _as_packed(self)
+
+        @classmethod
+        def from_packed(cls, blob, prefix=None, path_object=None,
+                        _from_packed=self.from_packed):
+            return _from_packed(blob, path_object=path_object)
+
+        @staticmethod
+        def packed_key(prefix=None, _packed_key=self.packed_key):
+            return _packed_key(prefix)
+
+        self.pathmetaclass.as_packed = as_packed
+        self.pathmetaclass.from_packed = from_packed
+        self.pathmetaclass.packed_key = packed_key
+
+    @staticmethod
+    def packed_key(prefix=None):
+        """ the xattr key that holds the blob for prefix """
+        if prefix:
+            return f'augpathlib.{prefix}.meta'.encode()
+        else:
+            return b'augpathlib.meta'
+
+    def as_packed(self, pathmeta):
+        fields = self.versions[self.version]
+        out = [self.magic, bytes((self.version,))]
+        for field_bytes, value in self.as_xattrs(pathmeta).items():
+            if len(value) > 0xffff:
+                msg = f'{field_bytes.decode()} too long to pack {len(value)}'
+                raise exc.UnhandledTypeError(msg)
+
+            out.append(self.header.pack(fields.index(field_bytes.decode()), len(value)))
+            out.append(value)
+
+        return b''.join(out)
+
+    def from_packed(self, blob, path_object=None):
+        if blob[:len(self.magic)] != self.magic:
+            raise exc.MetadataCorruptionError(f'not packed meta {blob[:8]!r}')
+
+        version = blob[len(self.magic)]
+        if version not in self.versions:
+            raise exc.MetadataCorruptionError(f'unknown packed meta version {version}')
+
+        fields = self.versions[version]
+        view = memoryview(blob)
+        offset = len(self.magic) + 1
+        xattrs = {}
+        try:
+            while offset < len(view):
+                index, length = self.header.unpack_from(view, offset)
+                offset += self.header.size
+                value = bytes(view[offset:offset + length])
+                if len(value) != length:
+                    raise struct.error('truncated value')
+
+                offset += length
+                xattrs[fields[index].encode()] = value
+        except (struct.error, IndexError) as e:
+            raise exc.MetadataCorruptionError(f'bad packed meta {e}') from e
+
+        return self.from_xattrs(xattrs, path_object=path_object)
+
+
+class _RestrictedUnpickler(pickle.Unpickler):
+    """ legacy metastore blobs are a pickled dict of bytes which
+        never needs a global, so refuse all of them """
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f'global {module}.{name} is forbidden')
+
+
+class _PathMetaAsMetastore(_PathMetaConverter):
+    """ Convert to and from a binary blob for storing in a database.
+
+        The blob is magic, a version byte, and a bitmask of which of
+        the version's fields are present, followed by the present fields
+        in order, each as a type tag and a fixed layout value, ints are
+        packed directly, strings and bytes are length prefixed, and
+        datetimes are int nanoseconds since the epoch plus the utc offset
+        so that nothing has to be parsed on the way back in.
+
+        Blobs from before this format are pickled xattrs dicts, those
+        are still read, but with an unpickler that cannot load globals. """
+
+    format_name = 'metastore'
+    magic = b'aps'
+    header = struct.Struct('<3sBI')  # magic, version, field mask
+    versions = {1: _PathMetaAsXattrs.fields}
+    version = 1
+
+    (T_INT, T_STR, T_BYTES, T_AWARE, T_NAIVE, T_ETAG, T_STRS) = range(7)
+    _tag = struct.Struct('<B')
+    _int = struct.Struct('<q')
+    _len = struct.Struct('<I')
+    _aware = struct.Struct('<qi')  # ns, utc offset seconds
+
+    _epoch_aware = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    _epoch_naive = datetime(1970, 1, 1)
+    _us = timedelta(microseconds=1)
+
+    def __init__(self):
+        def as_metastore(self, prefix=None, _as_metastore=self.as_metastore):
+            """ db entry, prefix is only used by legacy blobs """
+            return _as_metastore(self)
+
+        @classmethod
+        def from_metastore(cls, blob, prefix=None, _from_metastore=self.from_metastore):
+            """ db entry """
+            return _from_metastore(blob, prefix=prefix)
+
+        @staticmethod
+        def as_metastores(pathmetas, _as_metastore=self.as_metastore):
+            """ bulk version of as_metastore """
+            return [_as_metastore(pathmeta) for pathmeta in pathmetas]
+
+        @classmethod
+        def from_metastores(cls, blobs, prefix=None, _from_metastore=self.from_metastore):
+            """ bulk version of from_metastore """
+            return [_from_metastore(blob, prefix=prefix) for blob in blobs]
+
+        self.pathmetaclass.as_metastore = as_metastore
+        self.pathmetaclass.from_metastore = from_metastore
+        self.pathmetaclass.as_metastores = as_metastores
+        self.pathmetaclass.from_metastores = from_metastores
+
+        self._decoders = {self.T_INT: self._decode_int,
+                          self.T_STR: self._decode_str,
+                          self.T_BYTES: self._decode_bytes,
+                          self.T_AWARE: self._decode_aware,
+                          self.T_NAIVE: self._decode_naive,
+                          self.T_ETAG: self._decode_etag,
+                          self.T_STRS: self._decode_strs,}
+
+    def _ns(self, value, epoch):
+        return (value - epoch) // self._us * 1000
+
+    def _encode_str(self, value, out):
+        value = value.encode()
+        out.append(self._len.pack(len(value)))
+        out.append(value)
+
+    def encode(self, field, value, out):
+        """ append the tag and bytes for value to out """
+        tag = self._tag.pack
+        if isinstance(value, datetime):
+            offset = value.utcoffset() if value.tzinfo is not None else None
+            if offset is None:
+                out.append(tag(self.T_NAIVE))
+                out.append(self._int.pack(self._ns(value, self._epoch_naive)))
+            else:
+                out.append(tag(self.T_AWARE))
+                out.append(self._aware.pack(self._ns(value, self._epoch_aware),
+                                            offset // timedelta(seconds=1)))
+        elif isinstance(value, int):
+            out.append(tag(self.T_INT))
+            try:
+                out.append(self._int.pack(value))
+            except struct.error as e:
+                raise exc.UnhandledTypeError(f'{field} {value} does not fit') from e
+        elif isinstance(value, str):
+            out.append(tag(self.T_STR))
+            self._encode_str(value, out)
+        elif isinstance(value, bytes):
+            out.append(tag(self.T_BYTES))
+            out.append(self._len.pack(len(value)))
+            out.append(value)
+        elif field == 'etag':
+            checksum, count = value
+            out.append(tag(self.T_ETAG))
+            out.append(self._len.pack(len(checksum)))
+            out.append(checksum)
+            out.append(self._int.pack(count))
+        elif isinstance(value, (tuple, list)):
+            out.append(tag(self.T_STRS))
+            out.append(self._len.pack(len(value)))
+            for string in value:
+                self._encode_str(string, out)
+        else:
+            raise exc.UnhandledTypeError(f'dont know what to do with {field} {value!r}')
+
+    def as_metastore(self, pathmeta):
+        fields = self.versions[self.version]
+        mask = 0
+        out = [None]
+        for i, field in enumerate(fields):
+            if field in ('created', 'updated'):
+                value = getattr(pathmeta, '_' + field)  # don't parse strings
+            else:
+                value = getattr(pathmeta, field)
+
+            if value is None or isinstance(value, (tuple, list)) and not value:
+                continue
+
+            mask |= 1 << i
+            self.encode(field, value, out)
+
+        out[0] = self.header.pack(self.magic, self.version, mask)
+        return b''.join(out)
+
+    def _decode_int(self, blob, offset):
+        value, = self._int.unpack_from(blob, offset)
+        return value, offset + self._int.size
+
+    def _decode_bytes(self, blob, offset):
+        length, = self._len.unpack_from(blob, offset)
+        start = offset + self._len.size
+        end = start + length
+        if end > len(blob):
+            raise struct.error('truncated value')
+
+        return blob[start:end], end
+
+    def _decode_str(self, blob, offset):
+        value, offset = self._decode_bytes(blob, offset)
+        return value.decode(), offset
+
+    def _decode_aware(self, blob, offset):
+        ns, seconds = self._aware.unpack_from(blob, offset)
+        value = self._epoch_aware + timedelta(microseconds=ns // 1000)
+        tz = timezone(timedelta(seconds=seconds))  # zero gives timezone.utc
+        return value.astimezone(tz), offset + self._aware.size
+
+    def _decode_naive(self, blob, offset):
+        ns, offset = self._decode_int(blob, offset)
+        return self._epoch_naive + timedelta(microseconds=ns // 1000), offset
+
+    def _decode_etag(self, blob, offset):
+        checksum, offset = self._decode_bytes(blob, offset)
+        count, offset = self._decode_int(blob, offset)
+        return (checksum, count), offset
+
+    def _decode_strs(self, blob, offset):
+        count, = self._len.unpack_from(blob, offset)
+        offset += self._len.size
+        out = []
+        for _ in range(count):
+            value, offset = self._decode_str(blob, offset)
+            out.append(value)
+
+        return tuple(out), offset
+
+    def from_metastore(self, blob, prefix=None):
+        if not isinstance(blob, bytes):  # e.g. memoryview from a db driver
+            blob = bytes(blob)
+
+        if blob[:len(self.magic)] != self.magic:
+            if blob[:1] == b'\x80':  # pickle protocol 2 and up
+                return self.from_legacy(blob, prefix=prefix)
+
+            raise exc.MetadataCorruptionError(f'not a metastore blob {blob[:8]!r}')
+
+        try:
+            _, version, mask = self.header.unpack_from(blob)
+            if version not in self.versions:
+                msg = f'unknown metastore version {version}'
+                raise exc.MetadataCorruptionError(msg)
+
+            fields = self.versions[version]
+            if mask >> len(fields):
+                raise exc.MetadataCorruptionError(f'bad metastore field mask {mask:b}')
+
+            decoders = self._decoders
+            offset = self.header.size
+            kwargs = {}
+            for i, field in enumerate(fields):
+                if mask & (1 << i):
+                    tag = blob[offset]
+                    kwargs[field], offset = decoders[tag](blob, offset + 1)
+
+        except (struct.error, IndexError, KeyError, UnicodeDecodeError) as e:
+            raise exc.MetadataCorruptionError(f'bad metastore blob {e!r}') from e
+
+        if offset != len(blob):
+            raise exc.MetadataCorruptionError('trailing bytes in metastore blob')
+
+        return self.pathmetaclass(**kwargs)
+
+    def from_legacy(self, blob, prefix=None):
+        """ the pickled xattrs dicts that as_metastore used to produce """
+        try:
+            xattrs = _RestrictedUnpickler(io.BytesIO(blob)).load()
+        except (pickle.UnpicklingError, EOFError, ValueError) as e:
+            raise exc.MetadataCorruptionError(f'bad legacy metastore blob {e}') from e
+
+        if (not isinstance(xattrs, dict) or
+            not all(isinstance(k, bytes) and isinstance(v, bytes)
+                    for k, v in xattrs.items())):
+            raise exc.MetadataCorruptionError('legacy metastore blob is not xattrs')
+
+        return self.pathmetaclass.from_xattrs(xattrs, prefix)
+
+
 class _PathMetaAsPretty(_PathMetaConverter):
     """ Convert to and from unix xattrs. """
 
@@ -705,6 +1102,7 @@ class _PathMetaAsPretty(_PathMetaConverter):
         h = [['Key', f'Value    {title}']]
         rows = h + self.rows(pathmeta, human=human)
 
+        from terminaltables3 import AsciiTable  # slow import
         try:
             table = AsciiTable(rows, title=title).table
         except TypeError as e:
@@ -799,6 +1197,7 @@ class _PathMetaAsPrettyDiff(_PathMetaAsPretty):
         h = [['Key', 'Value', 'Key Other', 'Value Other']]
         rows = h + list(merge(self.rows(pathmeta, human=human),
                               self.rows(othermeta, human=human)))
+        from terminaltables3 import AsciiTable  # slow import
         try:
             table = AsciiTable(rows, title=title).table
         except TypeError as e:
@@ -881,5 +1280,7 @@ _bytes_encode = _EncodeByFieldBytes()
 # register helpers
 _PathMetaAsSymlink()
 _PathMetaAsXattrs()
+_PathMetaAsPacked()
+_PathMetaAsMetastore()
 _PathMetaAsPretty()
 _PathMetaAsPrettyDiff()  # TODO
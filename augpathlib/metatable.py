@@ -0,0 +1,346 @@
+""" column oriented storage for very many PathMeta
+
+each field is one array.array column, numbers are stored directly and
+every other value is stored as an int code into a pool shared by all
+the columns of a table so each distinct id, name, checksum, etc. is
+only held once no matter how many rows refer to it
+
+filters and joins work on the columns and return arrays of row
+numbers, if numpy is installed the columns are viewed as numpy arrays
+without copying, the work is vectorized, and row numbers are numpy
+arrays, otherwise the same results are computed with plain loops and
+row numbers are array('q'), rows are only turned back into PathMeta
+when they are asked for """
+
+import math
+from array import array
+from datetime import datetime, timezone
+from augpathlib.meta import PathMeta
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
+NULL = -2 ** 63  # None in the int columns
+NONE = -1  # None in the pooled columns
+MISSING = -2  # a value the other table has never seen
+
+# created and updated are stored as a float timestamp plus a kind
+# so that naive, aware, and int values come back as they went in
+_KIND_NONE, _KIND_AWARE, _KIND_NAIVE, _KIND_INT = range(4)
+
+_int_fields = ('size', 'chunksize')
+_time_fields = ('created', 'updated')
+_pooled_fields = tuple(f for f in PathMeta._fields
+                       if f not in _int_fields)
+
+
+def _index_array(indices):
+    return array('q', indices)
+
+
+class PathMetaTable:
+    """ columns of PathMeta fields, see the module docstring
+
+        numpy=None uses numpy if it is installed, False never does """
+
+    def __init__(self, metas=tuple(), numpy=None):
+        self._np = _np if numpy is None or numpy else None
+        if numpy and _np is None:
+            raise ModuleNotFoundError('numpy is not installed')
+
+        self._pool = []
+        self._codes = {}
+        self._columns = {f:array('q') for f in _int_fields}
+        self._columns.update({f:array('i') for f in _pooled_fields})
+        for field in _time_fields:
+            self._columns[field] = array('d')
+            self._columns[field + '_kind'] = array('b')
+
+        self._extra = {}  # row -> kwargs PathMeta did not know about
+        self._id_index = None
+        self.extend(metas)
+
+    def _empty(self):
+        new = self.__class__.__new__(self.__class__)
+        new._np = self._np
+        new._pool = self._pool  # append only so codes stay valid
+        new._codes = self._codes
+        new._columns = {k:array(v.typecode) for k, v in self._columns.items()}
+        new._extra = {}
+        new._id_index = None
+        return new
+
+    # building
+
+    def _code(self, value):
+        if value is None:
+            return NONE
+
+        key = type(value), value  # 1 and True are different values here
+        try:
+            return self._codes[key]
+        except KeyError:
+            code = self._codes[key] = len(self._pool)
+            self._pool.append(value)
+            return code
+
+    @staticmethod
+    def _time(value):
+        if value is None:
+            return math.nan, _KIND_NONE
+        elif isinstance(value, datetime):
+            if value.tzinfo is not None and value.tzinfo.utcoffset(value) is not None:
+                return value.timestamp(), _KIND_AWARE
+            else:
+                return value.replace(tzinfo=timezone.utc).timestamp(), _KIND_NAIVE
+        elif isinstance(value, int):
+            return float(value), _KIND_INT
+        else:
+            raise TypeError(f'not a time {value!r}')
+
+    def append(self, pathmeta):
+        columns = self._columns
+        for field in _int_fields:
+            value = getattr(pathmeta, field)
+            columns[field].append(NULL if value is None else value)
+
+        for field in _pooled_fields:
+            columns[field].append(self._code(getattr(pathmeta, field)))
+
+        for field in _time_fields:
+            value, kind = self._time(getattr(pathmeta, field))
+            columns[field].append(value)
+            columns[field + '_kind'].append(kind)
+
+        extra = getattr(pathmeta, '_PathMeta__kwargs', None)
+        if extra:
+            self._extra[len(self) - 1] = extra
+
+        self._id_index = None
+
+    def extend(self, metas):
+        for pathmeta in metas:
+            self.append(pathmeta)
+
+    @classmethod
+    def from_metas(cls, metas, numpy=None):
+        return cls(metas, numpy=numpy)
+
+    # rows
+
+    def __len__(self):
+        return len(self._columns['id'])
+
+    def _value(self, field, row):
+        if field in _int_fields:
+            value = self._columns[field][row]
+            return None if value == NULL else value
+        elif field in _time_fields:
+            value = self._columns[field][row]
+            kind = self._columns[field + '_kind'][row]
+            if kind == _KIND_NONE:
+                return None
+            elif kind == _KIND_AWARE:
+                return datetime.fromtimestamp(value, timezone.utc)
+            elif kind == _KIND_NAIVE:
+                return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+            else:
+                return int(value)
+        else:
+            code = self._columns[field][row]
+            return None if code == NONE else self._pool[code]
+
+    def row(self, row):
+        """ materialize one row as a PathMeta """
+        if row < 0:
+            row += len(self)
+
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+
+        kwargs = {f:self._value(f, row) for f in _int_fields + _pooled_fields + _time_fields}
+        kwargs['errors'] = kwargs['errors'] or tuple()
+        kwargs.update(self._extra.get(row, {}))
+        return PathMeta(**kwargs)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self.row(key)
+        elif isinstance(key, slice):
+            return self.take(range(*key.indices(len(self))))
+        else:
+            return self.take(key)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.row(row)
+
+    def values(self, field):
+        """ the python values of one column as a list """
+        return [self._value(field, row) for row in range(len(self))]
+
+    def take(self, rows):
+        """ a new table with only rows, in the order given """
+        new = self._empty()
+        for name, column in self._columns.items():
+            if self._np is not None:
+                view = self._np.frombuffer(column, dtype=column.typecode)
+                new._columns[name].frombytes(view[self._np.asarray(rows, dtype='int64')].tobytes())
+            else:
+                new_column = new._columns[name]
+                for row in rows:
+                    new_column.append(column[row])
+
+        for i, row in enumerate(rows):
+            if row in self._extra:
+                new._extra[i] = self._extra[row]
+
+        return new
+
+    # vectorized access
+
+    def _view(self, field):
+        column = self._columns[field]
+        return self._np.frombuffer(column, dtype=column.typecode)
+
+    def _rows(self, mask):
+        if self._np is not None:
+            return self._np.flatnonzero(mask)
+
+        return _index_array(row for row, ok in enumerate(mask) if ok)
+
+    def where_size(self, min=None, max=None):
+        """ rows with min <= size < max, rows without a size never match """
+        if self._np is not None:
+            sizes = self._view('size')
+            mask = sizes != NULL
+            if min is not None:
+                mask &= sizes >= min
+            if max is not None:
+                mask &= sizes < max
+
+            return self._rows(mask)
+
+        return self._rows(size != NULL and
+                          (min is None or size >= min) and
+                          (max is None or size < max)
+                          for size in self._columns['size'])
+
+    def where_updated_after(self, when):
+        """ rows updated strictly after when, a datetime or timestamp,
+            naive datetimes are compared as if they were utc """
+        threshold, _ = self._time(when) if isinstance(when, datetime) else (when, None)
+        if self._np is not None:
+            return self._rows(self._view('updated') > threshold)  # nan is never greater
+
+        return self._rows(value > threshold for value in self._columns['updated'])
+
+    def where_checksum(self, checksum):
+        """ rows whose checksum equals checksum """
+        return self.where('checksum', checksum)
+
+    def where(self, field, value):
+        """ rows where a pooled field equals value """
+        if field not in _pooled_fields:
+            raise ValueError(f'{field} is not a pooled field')
+
+        code = self._codes.get((type(value), value), MISSING)
+        if self._np is not None:
+            return self._rows(self._view(field) == code)
+
+        return self._rows(c == code for c in self._columns[field])
+
+    # ids
+
+    def _index(self):
+        # code of the id -> row, the last row wins for duplicate ids
+        if self._id_index is None:
+            self._id_index = {code:row for row, code in enumerate(self._columns['id'])
+                              if code != NONE}
+
+        return self._id_index
+
+    def row_of(self, id):
+        """ row number of id, raises KeyError if it is not in the table """
+        code = self._codes.get((str, id))
+        if code is None or code not in self._index():
+            raise KeyError(id)
+
+        return self._index()[code]
+
+    def __contains__(self, id):
+        try:
+            self.row_of(id)
+            return True
+        except KeyError:
+            return False
+
+    def _translate(self, other, field):
+        """ the codes that other uses for the values in a column of self,
+            MISSING where other has never seen the value, NONE stays NONE """
+        if other._pool is self._pool:
+            return self._view(field) if self._np is not None else self._columns[field]
+
+        trans = [other._codes.get((type(value), value), MISSING) for value in self._pool]
+        if self._np is not None:
+            trans = self._np.array(trans + [NONE], dtype='int64')
+            return trans[self._view(field)]  # NONE indexes the trailing NONE
+
+        return array('q', (NONE if code == NONE else trans[code]
+                           for code in self._columns[field]))
+
+    def join(self, other):
+        """ (rows of self, rows of other) for every id in both tables """
+        codes = self._translate(other, 'id')
+        if self._np is not None:
+            np = self._np
+            lookup = np.full(len(other._pool) + 2, -1, dtype='int64')
+            for code, row in other._index().items():
+                lookup[code] = row
+
+            # NONE and MISSING index the trailing -1s
+            right = lookup[codes]
+            left = np.flatnonzero(right != -1)
+            return left, right[left]
+
+        index = other._index()
+        left = array('q')
+        right = array('q')
+        for row, code in enumerate(codes):
+            if code in index:
+                left.append(row)
+                right.append(index[code])
+
+        return left, right
+
+    def changed(self, other):
+        """ rows of self whose id is in other but whose size, checksum,
+            or updated differ from the row in other, updated is only
+            compared when neither row has a checksum """
+        left, right = self.join(other)
+        checksums = self._translate(other, 'checksum')
+        if self._np is not None:
+            np = self._np
+            lsum = checksums[left]
+            rsum = other._view('checksum')[right]
+            has_sum = (lsum != NONE) & (rsum != NONE)
+            mask = self._view('size')[left] != other._view('size')[right]
+            mask |= has_sum & (lsum != rsum)
+            lup, rup = self._view('updated')[left], other._view('updated')[right]
+            mask |= ~has_sum & (lup != rup) & ~(np.isnan(lup) & np.isnan(rup))
+            return left[mask]
+
+        lsize, rsize = self._columns['size'], other._columns['size']
+        lup, rup = self._columns['updated'], other._columns['updated']
+        rsums = other._columns['checksum']
+        out = array('q')
+        for l, r in zip(left, right):
+            has_sum = checksums[l] != NONE and rsums[r] != NONE
+            if (lsize[l] != rsize[r] or
+                has_sum and checksums[l] != rsums[r] or
+                not has_sum and lup[l] != rup[r] and
+                not (math.isnan(lup[l]) and math.isnan(rup[r]))):
+                out.append(l)
+
+        return out
@@ -0,0 +1,86 @@
+""" mimetype detection for many paths at once
+
+libmagic handles are expensive to open and are not thread safe so
+each thread keeps its own, results are cached by file identity """
+
+import os
+import threading
+from augpathlib.utils import bounded_imap_unordered
+
+_local = threading.local()
+_cache = {}
+_cache_max = 2 ** 16
+_cache_lock = threading.Lock()
+
+
+def _detector():
+    """ a per thread function that takes a path string and returns its mime """
+    try:
+        return _local.detect
+    except AttributeError:
+        pass
+
+    try:
+        import magic  # from sys-apps/file consider python-magic ?
+    except (AttributeError, ImportError, TypeError) as e:
+        msg = ('no module magic found from either python-magic '
+               'or from libmagic python bindings')
+        raise ModuleNotFoundError(msg) from e
+
+    # both bindings define Magic, only python-magic has from_file
+    if hasattr(magic, 'from_file'):
+        # python-magic
+        detect = magic.Magic(mime=True).from_file
+    else:
+        # sys-apps/file python-magic api
+        cookie = magic.open(magic.MAGIC_MIME_TYPE)
+        cookie.load()
+        detect = cookie.file
+
+    _local.detect = detect
+    return detect
+
+
+def magic_mimetype(path, st=None):
+    """ libmagic mimetype of path, None if path does not exist
+
+        cached by (st_dev, st_ino, st_mtime_ns) so unchanged files are
+        only opened once per process no matter how they are named """
+    if st is None:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+
+    key = st.st_dev, st.st_ino, st.st_mtime_ns
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+
+    mime = _detector()(os.fspath(path))
+    with _cache_lock:
+        if len(_cache) >= _cache_max:
+            _cache.pop(next(iter(_cache)))  # oldest first
+
+        _cache[key] = mime
+
+    return mime
+
+
+def _mimetype(path):
+    # suffix first, only open the file if the name is not enough
+    mime = path.mimetype
+    if mime is None:
+        mime = magic_mimetype(path)
+
+    return mime
+
+
+def mimetypes_for(paths, jobs=None):
+    """ yields (path, mimetype) for paths as they are classified
+
+        the name based mimetype is used when there is one and libmagic
+        is only consulted for the rest, on a pool of jobs threads each
+        with its own libmagic handle, see utils.bounded_imap_unordered """
+    yield from bounded_imap_unordered(_mimetype, paths, jobs=jobs)
@@ -0,0 +1,222 @@
+""" reading many byte ranges from one file
+
+ranges are normalized against the size of the file with python slice
+semantics and always served in the order they were requested
+
+requests are taken in windows that hold at most block_max bytes of
+requested data (and at most window_max requests), each window is sorted
+by offset and ranges that overlap or are separated by no more than gap
+bytes are coalesced into blocks of at most block_max bytes, each block
+is read with preadv into one buffer reused for the whole call and the
+ranges in it are copied out and held until the window is served, so
+thousands of small samples requested in any order cost a few large
+reads and memory stays bounded by about two block_max
+
+any range longer than block_max and any range without an end is streamed
+in chunks so that reading a whole large file never holds it in memory,
+ranges without an end are read until the end of the file even if it
+grew since it was opened
+
+files that are not regular files or that report a size of zero
+(/proc, sysfs, fifos, etc.) are read sequentially without relying
+on their size, so negative offsets cannot be used for them """
+
+import os
+import errno
+from stat import S_ISREG
+
+gap_default = 4096
+block_max_default = 1024 ** 2
+window_max_default = 4096
+
+
+def _bounds(range_):
+    try:
+        start, end = range_
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'range must be (start, end) not {range_!r}') from e
+
+    if not isinstance(start, int) or not (end is None or isinstance(end, int)):
+        raise TypeError(f'range bounds must be int or None not {range_!r}')
+
+    return start, end
+
+
+def normalize(range_, size):
+    """ (start, end) -> absolute (start, end) with 0 <= start <= end <= size
+
+        start and end follow slice semantics, negative values count
+        from the end of the file and end=None reads to the end """
+    start, end = _bounds(range_)
+    start, end, _ = slice(start, end).indices(size)
+    return start, max(start, end)
+
+
+def coalesce(spans, gap=gap_default, block_max=block_max_default):
+    """ group normalized (start, end) spans into blocks in file order
+
+        returns a list of (start, end, indices) where indices are the
+        positions in spans of every span served from the block [start,
+        end), no block is longer than block_max unless a single span is """
+    order = sorted(range(len(spans)), key=lambda i: spans[i])
+    blocks = []
+    for i in order:
+        start, end = spans[i]
+        if blocks:
+            bstart, bend, indices = blocks[-1]
+            if start <= bend + gap and max(end, bend) - bstart <= block_max:
+                indices.append(i)
+                blocks[-1] = bstart, max(end, bend), indices
+                continue
+
+        blocks.append((start, end, [i]))
+
+    return blocks
+
+
+def _pread(fd, size, offset):
+    if hasattr(os, 'pread'):
+        return os.pread(fd, size, offset)
+    else:  # windows
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, size)
+
+
+def _pread_full(fd, size, offset):
+    """ read size bytes from offset, only short if the file ended """
+    data = _pread(fd, size, offset)
+    if len(data) == size or not data:
+        return data
+
+    parts = [data]
+    done = len(data)
+    while done < size:
+        data = _pread(fd, size - done, offset + done)
+        if not data:
+            break
+
+        parts.append(data)
+        done += len(data)
+
+    return b''.join(parts)
+
+
+def _read_into(fd, buffer, size, offset):
+    """ fill buffer[:size] from offset and return a view of the bytes
+        read, only short if the file ended """
+    view = memoryview(buffer)[:size]
+    done = 0
+    while done < size:
+        if hasattr(os, 'preadv'):
+            n = os.preadv(fd, [view[done:]], offset + done)
+        else:  # windows
+            data = _pread(fd, size - done, offset + done)
+            n = len(data)
+            view[done:done + n] = data
+
+        if not n:
+            break
+
+        done += n
+
+    return view[:done]
+
+
+def _stream(fd, start, end, chunksize):
+    offset = start
+    while end is None or offset < end:
+        size = chunksize if end is None else min(chunksize, end - offset)
+        data = _pread(fd, size, offset)
+        if not data:
+            break
+
+        yield data
+        offset += len(data)
+
+
+def _read_sequential(fd, ranges, chunksize):
+    """ ranges from a file whose size cannot be trusted """
+    for range_ in ranges:
+        start, end = _bounds(range_)
+        if start < 0 or end is not None and end < 0:
+            msg = f'negative offsets need a file with a known size {range_!r}'
+            raise ValueError(msg)
+
+        try:
+            os.lseek(fd, start, os.SEEK_SET)
+        except OSError as e:
+            # pipes can only be read from where they are
+            if e.errno != errno.ESPIPE or start:
+                raise e
+
+        remaining = None if end is None else max(end - start, 0)
+        while remaining is None or remaining > 0:
+            data = os.read(fd, chunksize if remaining is None else min(chunksize, remaining))
+            if not data:
+                break
+
+            yield data
+            if remaining is not None:
+                remaining -= len(data)
+
+
+def _read_window(fd, spans, buffer, chunksize, gap, block_max):
+    """ yield the pieces of spans in order reading them in file order,
+        returns the buffer which is replaced if it was too small """
+    pieces = [None] * len(spans)
+    for bstart, bend, indices in coalesce(spans, gap=gap, block_max=block_max):
+        if len(buffer) < bend - bstart:
+            buffer = bytearray(max(bend - bstart, min(2 * len(buffer), block_max)))
+
+        view = _read_into(fd, buffer, bend - bstart, bstart)
+        for i in indices:
+            start, end = spans[i]
+            start, end = start - bstart, min(end - bstart, len(view))
+            # copies since the buffer is reused for the next block
+            pieces[i] = [bytes(view[offset:min(offset + chunksize, end)])
+                         for offset in range(start, end, chunksize)]
+
+        view.release()
+
+    for chunks in pieces:
+        yield from chunks
+
+    return buffer
+
+
+def read_ranges(fd, ranges, chunksize, gap=gap_default, block_max=block_max_default,
+                window_max=window_max_default):
+    """ yield the bytes of each range in ranges in order, each range
+        is yielded in pieces of at most chunksize, empty ranges yield
+        nothing, if the file is shorter than a range claims, e.g. because
+        it was truncated while reading, only the bytes present are yielded """
+    st = os.fstat(fd)
+    if not S_ISREG(st.st_mode) or not st.st_size:
+        yield from _read_sequential(fd, ranges, chunksize)
+        return
+
+    size = st.st_size
+    buffer = bytearray()
+    window = []
+    held = 0
+    for range_ in ranges:
+        start, end = _bounds(range_)
+        if end is None:
+            start, end = normalize((start, None), size)[0], None
+        else:
+            start, end = normalize((start, end), size)
+
+        if window and (end is None or end - start > block_max or
+                       held + end - start > block_max or len(window) >= window_max):
+            buffer = yield from _read_window(fd, window, buffer, chunksize, gap, block_max)
+            window = []
+            held = 0
+
+        if end is None or end - start > block_max:
+            yield from _stream(fd, start, end, chunksize)
+        else:
+            window.append((start, end))
+            held += end - start
+
+    if window:
+        yield from _read_window(fd, window, buffer, chunksize, gap, block_max)
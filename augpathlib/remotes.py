@@ -9,10 +9,6 @@ from augpathlib.meta import PathMeta
 from augpathlib import caches, LocalPath
 from augpathlib.core import need_flavour
 from augpathlib.utils import _bind_sysid_, StatResult, cypher_command_lookup, log
-if os.name != 'nt':
-    # pexpect on windows does not support pxssh
-    # because it is missing spawn
-    from pexpect import pxssh
 
 
 class RemotePath:
@@ -683,6 +679,9 @@ class SshRemote(RemotePath, pathlib.PurePath):
             else:
                 cls._anchor = pathlib.PurePath.__new__(cls, path)
 
+            # pexpect on windows does not support pxssh
+            # because it is missing spawn, also slow to import
+            from pexpect import pxssh
             session = pxssh.pxssh(options=dict(IdentityAgent=os.environ.get('SSH_AUTH_SOCK')))
             session.login(host, ssh_config=LocalPath('~/.ssh/config').expanduser().as_posix())
             cls._rows = 200
@@ -374,7 +374,8 @@ class RepoHelper:
 
 
 class RepoPath(RepoHelper, AugmentedPath):
-    def rmtree(self, ignore_errors=False, onerror=None, DANGERZONE=False):
+    def rmtree(self, ignore_errors=False, onerror=None, DANGERZONE=False, jobs=1,
+               background=False, progress=None):
         if self in self._repos:
             # remove the reference to the soon to be stale repo
             # in order to prevent GitPython cmd.Git._get_persistent_cmd
@@ -385,7 +386,10 @@ class RepoPath(RepoHelper, AugmentedPath):
 
         super().rmtree(ignore_errors=ignore_errors,
                        onerror=onerror,
-                       DANGERZONE=DANGERZONE)
+                       DANGERZONE=DANGERZONE,
+                       jobs=jobs,
+                       background=background,
+                       progress=progress)
 
 
 RepoPath._bind_flavours()
@@ -0,0 +1,146 @@
+""" in process statx(2) for linux
+
+gets birth time and nanosecond timestamps without spawning stat(1)
+and works in cases where os.stat fails such as EOVERFLOW """
+
+import os
+import sys
+import errno
+import ctypes
+from augpathlib.utils import StatResult, _libc_function
+
+AT_FDCWD = -100
+AT_SYMLINK_NOFOLLOW = 0x100
+AT_STATX_SYNC_AS_STAT = 0x0000
+
+STATX_BASIC_STATS = 0x07ff
+STATX_BTIME = 0x0800
+
+_SYS_statx = {
+    'x86_64': 332,
+    'i386': 383,
+    'i686': 383,
+    'aarch64': 291,
+    'riscv64': 291,
+    'loongarch64': 291,
+    'armv7l': 397,
+    'ppc64le': 383,
+    'ppc64': 383,
+    's390x': 379,
+}
+
+
+class _statx_timestamp(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_int64),
+                ('tv_nsec', ctypes.c_uint32),
+                ('__reserved', ctypes.c_int32)]
+
+
+class _statx(ctypes.Structure):
+    """ struct statx from linux/stat.h padded to its full 256 bytes """
+    _fields_ = [('stx_mask', ctypes.c_uint32),
+                ('stx_blksize', ctypes.c_uint32),
+                ('stx_attributes', ctypes.c_uint64),
+                ('stx_nlink', ctypes.c_uint32),
+                ('stx_uid', ctypes.c_uint32),
+                ('stx_gid', ctypes.c_uint32),
+                ('stx_mode', ctypes.c_uint16),
+                ('__spare0', ctypes.c_uint16),
+                ('stx_ino', ctypes.c_uint64),
+                ('stx_size', ctypes.c_uint64),
+                ('stx_blocks', ctypes.c_uint64),
+                ('stx_attributes_mask', ctypes.c_uint64),
+                ('stx_atime', _statx_timestamp),
+                ('stx_btime', _statx_timestamp),
+                ('stx_ctime', _statx_timestamp),
+                ('stx_mtime', _statx_timestamp),
+                ('stx_rdev_major', ctypes.c_uint32),
+                ('stx_rdev_minor', ctypes.c_uint32),
+                ('stx_dev_major', ctypes.c_uint32),
+                ('stx_dev_minor', ctypes.c_uint32),
+                ('__spare2', ctypes.c_uint64 * 14)]
+
+
+assert ctypes.sizeof(_statx) == 256
+
+
+class StatxResult(StatResult):
+    """ StatResult compatible result of statx, has the usual os.stat_result
+        fields including the _ns times, st_birthtime and st_birthtime_ns
+        are only present if the file system reports a birth time """
+
+    def __init__(self, stx, name=None):
+        self.name = name
+        self.st_mode = stx.stx_mode
+        self.st_ino = stx.stx_ino
+        self.st_dev = os.makedev(stx.stx_dev_major, stx.stx_dev_minor)
+        self.st_rdev = os.makedev(stx.stx_rdev_major, stx.stx_rdev_minor)
+        self.st_nlink = stx.stx_nlink
+        self.st_uid = stx.stx_uid
+        self.st_gid = stx.stx_gid
+        self.st_size = stx.stx_size
+        self.st_blksize = stx.stx_blksize
+        self.st_blocks = stx.stx_blocks
+        for field in ('atime', 'mtime', 'ctime'):
+            ns = self._ns(getattr(stx, 'stx_' + field))
+            setattr(self, f'st_{field}_ns', ns)
+            setattr(self, f'st_{field}', ns / 1e9)
+
+        if stx.stx_mask & STATX_BTIME:
+            self.st_birthtime_ns = self._ns(stx.stx_btime)
+            self.st_birthtime = self.st_birthtime_ns / 1e9
+
+    @staticmethod
+    def _ns(ts):
+        return ts.tv_sec * 10 ** 9 + ts.tv_nsec
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(st_mode={self.st_mode:o}, st_ino={self.st_ino}, st_size={self.st_size})'
+
+
+_function = None
+
+
+def _resolve():
+    if sys.platform != 'linux':
+        raise NotImplementedError('statx is only available on linux')
+
+    argtypes = (ctypes.c_int,                # dir fd
+                ctypes.c_char_p,             # path
+                ctypes.c_int,                # flags
+                ctypes.c_uint,               # mask
+                ctypes.POINTER(_statx))      # result
+    return _libc_function('statx', _SYS_statx, argtypes)
+
+
+def available():
+    global _function
+    if _function is None:
+        try:
+            _function = _resolve()
+        except NotImplementedError:
+            _function = False
+
+    return bool(_function)
+
+
+def statx(path, follow_symlinks=True, dir_fd=AT_FDCWD, mask=STATX_BASIC_STATS | STATX_BTIME):
+    """ stat path with statx(2), raises NotImplementedError if the
+        platform, libc, or kernel does not have it """
+    if not available():
+        raise NotImplementedError('statx is not available')
+
+    flags = AT_STATX_SYNC_AS_STAT
+    if not follow_symlinks:
+        flags |= AT_SYMLINK_NOFOLLOW
+
+    stx = _statx()
+    path = os.fspath(path)
+    if _function(dir_fd, os.fsencode(path), flags, mask, ctypes.byref(stx)) != 0:
+        e = ctypes.get_errno()
+        if e == errno.ENOSYS:  # old kernel or seccomp
+            raise NotImplementedError('statx is not available')
+
+        raise OSError(e, os.strerror(e), path)
+
+    return StatxResult(stx, name=path)
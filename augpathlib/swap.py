@@ -1,5 +1,6 @@
 import os
 import sys
+import errno
 import ctypes
 
 # linux renameat2
@@ -12,30 +13,157 @@ def swap_not_implemented(self, target):
 
 
 if sys.platform == 'linux':  # windows will error on ctypes.CDLL without this
-    # setup for calling renameat2
-    SYS_renameat2 = 316  # from /usr/include/asm/unistd_64.h
-    RENAME_EXCHANGE = (1 << 1)  # /usr/src/linux/include/uapi/linux/fs.h
-    libc = ctypes.CDLL(None)
-    rnat2_syscall = libc.syscall
-    rnat2_syscall.restypes = ctypes.c_int       # returns an int
-    rnat2_syscall.argtypes = (ctypes.c_int,     # syscall number
-                              ctypes.c_int,     # old dir fd
-                              ctypes.c_char_p,  # oldpath
-                              ctypes.c_int,     # new dir fd
-                              ctypes.c_char_p,  # newpath
-                              ctypes.c_uint)    # flags
+    import platform
+    from augpathlib.utils import _libc_function
+    _SYS_renameat2 = {
+        'x86_64': 316,
+        'i386': 353,
+        'i686': 353,
+        'aarch64': 276,
+        'riscv64': 276,
+        'loongarch64': 276,
+        'armv7l': 382,
+        'ppc64le': 357,
+        'ppc64': 357,
+        's390x': 347,
+    }
+    SYS_renameat2 = _SYS_renameat2.get(platform.machine())
+    RENAME_NOREPLACE = (1 << 0)  # /usr/src/linux/include/uapi/linux/fs.h
+    RENAME_EXCHANGE = (1 << 1)
+    AT_FDCWD = -100
+    _renameat2 = None
+
+    def _resolve_renameat2():
+        argtypes = (ctypes.c_int,     # old dir fd
+                    ctypes.c_char_p,  # oldpath
+                    ctypes.c_int,     # new dir fd
+                    ctypes.c_char_p,  # newpath
+                    ctypes.c_uint)    # flags
+        return _libc_function('renameat2', _SYS_renameat2, argtypes)
+
+    def renameat2(old_dir_fd, old_path, new_dir_fd, new_path, flags):
+        """ paths are relative to their dir fds unless they are absolute
+            use AT_FDCWD as the fd for paths relative to the working dir """
+        global _renameat2
+        if _renameat2 is None:
+            _renameat2 = _resolve_renameat2()
+
+        value = _renameat2(old_dir_fd, os.fsencode(old_path),
+                           new_dir_fd, os.fsencode(new_path),
+                           flags)
+        if value != 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), os.fspath(old_path), None, os.fspath(new_path))
 
     def swap_linux(self, target):
         """ use renameat2 to perform an atomic swap operation """
-        old_fd = os.open(self, 0)
-        new_fd = os.open(target, 0)
-        old_path = os.fspath(self).encode()
-        new_path = os.fspath(target).encode()
-        value = rnat2_syscall(SYS_renameat2,
-                              old_fd, old_path,
-                              new_fd, new_path,
-                              RENAME_EXCHANGE)
-        os.close(old_fd)
-        os.close(new_fd)
-        if value != 0:
-            raise OSError(value, 'renameat2 failed', self, None, target)
+        renameat2(AT_FDCWD, self, AT_FDCWD, target, RENAME_EXCHANGE)
+
+    _dir_flags = getattr(os, 'O_PATH', os.O_RDONLY) | os.O_DIRECTORY | os.O_CLOEXEC
+
+
+class SwapTransaction:
+    """ stage many swaps and apply them as a unit
+
+        each staged pair (source, target) is exchanged with RENAME_EXCHANGE
+        relative to held file descriptors for the parent directories so
+        no path is resolved more than once, if target does not exist then
+        source is moved into place with RENAME_NOREPLACE
+
+        if any pair fails every pair that was already applied is undone
+        in reverse order and the error is raised, other processes may
+        observe the intermediate states since each pair is atomic on
+        its own but the transaction as a whole is not
+
+        use as a context manager to commit and close on exit or call
+        commit and close directly, rollback undoes every applied pair
+        but needs the directory fds so it only works before close, to
+        be able to roll back after a successful commit call commit
+        inside the with block and rollback before it exits """
+
+    def __init__(self):
+        if sys.platform != 'linux':
+            raise NotImplementedError('This OS has no atomic swap operation!')
+
+        self._dir_fds = {}
+        self._staged = []
+        self._applied = []
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            self.close()
+
+    def _check_open(self, action):
+        if self._closed:
+            raise ValueError(f'cannot {action} a closed SwapTransaction')
+
+    def _dir_fd(self, directory):
+        self._check_open('add to')
+        key = os.fspath(directory)
+        if key not in self._dir_fds:
+            self._dir_fds[key] = os.open(key, _dir_flags)
+
+        return self._dir_fds[key]
+
+    def add(self, source, target):
+        """ stage source to replace target """
+        source_fd = self._dir_fd(os.path.dirname(os.fspath(source)) or '.')
+        target_fd = self._dir_fd(os.path.dirname(os.fspath(target)) or '.')
+        self._staged.append((source, source_fd, os.path.basename(source),
+                             target, target_fd, os.path.basename(target)))
+
+    def __len__(self):
+        return len(self._staged)
+
+    def commit(self):
+        """ apply every staged pair, roll back and raise on failure """
+        self._check_open('commit')
+        staged, self._staged = self._staged, []
+        for pair in staged:
+            source, sfd, sname, target, tfd, tname = pair
+            try:
+                try:
+                    renameat2(sfd, sname, tfd, tname, RENAME_EXCHANGE)
+                    self._applied.append((RENAME_EXCHANGE, pair))
+                except FileNotFoundError:
+                    # new file, source missing will fail here too
+                    renameat2(sfd, sname, tfd, tname, RENAME_NOREPLACE)
+                    self._applied.append((RENAME_NOREPLACE, pair))
+
+            except BaseException as e:
+                self.rollback()
+                raise e
+
+    def rollback(self):
+        """ undo applied pairs in reverse order """
+        if self._applied:
+            self._check_open('roll back')
+
+        errors = []
+        while self._applied:
+            flags, (source, sfd, sname, target, tfd, tname) = self._applied.pop()
+            try:
+                if flags == RENAME_EXCHANGE:
+                    renameat2(sfd, sname, tfd, tname, RENAME_EXCHANGE)
+                else:
+                    renameat2(tfd, tname, sfd, sname, RENAME_NOREPLACE)
+            except OSError as e:
+                errors.append(e)
+
+        if errors:
+            msg = f'rollback failed for {len(errors)} paths'
+            raise OSError(errno.EIO, msg) from errors[0]
+
+    def close(self):
+        for fd in self._dir_fds.values():
+            os.close(fd)
+
+        self._dir_fds = {}
+        self._closed = True
@@ -0,0 +1,387 @@
+""" directory traversal on a pool of threads
+
+on network file systems (nfs, lustre, sshfs, etc.) every directory
+listing is a round trip so walking a tree one directory at a time
+scales with the depth and breadth of the tree instead of with the
+number of requests the server can have outstanding """
+
+import os
+import sys
+import queue
+import threading
+from augpathlib.utils import default_jobs, bounded_imap_unordered
+
+orders = ('unordered', 'sorted', 'topdown')
+
+_done = object()
+_poll = 0.05  # seconds between checks of the stop event
+
+
+def _name(path):
+    return path.name
+
+
+def _is_subdir(path):
+    # never traverse symlinked directories
+    return path.is_dir() and not path.is_symlink()
+
+
+def _list(directory, order, follow_stat, cache, onerror):
+    """ children and subdirectories of directory, the types come from
+        the DirEntry which is dropped afterward unless cache is set """
+    try:
+        children = list(directory.scandir(follow_stat=follow_stat, cache=True))
+    except OSError:
+        onerror(directory.scandir, directory, sys.exc_info())
+        children = []
+
+    if order == 'sorted':
+        children.sort(key=_name)
+
+    subdirs = [c for c in children if _is_subdir(c)]
+    if not cache:
+        for child in children:
+            child.invalidate_stat()
+
+    return children, subdirs
+
+
+def _serial(root, order, follow_stat, cache, onerror):
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        children, subdirs = _list(directory, order, follow_stat, cache, onerror)
+        yield directory, children
+        stack.extend(reversed(subdirs))
+
+
+def scandir_parallel(root, jobs=None, order='unordered', follow_stat=False,
+                     maxsize=None, cache=False, onerror=None):
+    """ list every directory in the tree under root, root included
+
+        yields (directory, children) where children are the paths
+        from directory.scandir(cache=cache), the DirEntry is always
+        used to find subdirectories but only kept if cache is set
+
+        directories are pulled from a shared queue by jobs scandir
+        workers, listings go to a bounded queue of maxsize so that a
+        slow consumer stalls the workers instead of filling memory
+
+        order
+        unordered   listings are yielded as soon as they complete
+        sorted      children are sorted by name within each listing
+        topdown     a directory is always yielded before any of its
+                    subdirectories, this costs some parallelism since
+                    subdirectories are only queued after their parent
+                    has been handed off
+
+        jobs=None uses default_jobs(), jobs=1 walks in the calling
+        thread depth first which is also topdown, symlinked directories
+        are not traversed
+
+        onerror(func, path, exc_info) is called when a directory cannot
+        be listed, that directory then has no children, it may raise to
+        stop the walk and is called from the worker threads when jobs
+        is not 1, by default unreadable subdirectories are skipped and
+        any other error, or any error listing root, is raised here """
+
+    if order not in orders:
+        raise ValueError(f'unknown order {order!r} not in {orders}')
+
+    if onerror is None:
+        def onerror(func, path, exc_info):
+            if path is root or not isinstance(exc_info[1], PermissionError):
+                raise exc_info[1]
+
+    if jobs is None:
+        jobs = default_jobs()
+
+    if jobs <= 1:
+        yield from _serial(root, order, follow_stat, cache, onerror)
+        return
+
+    if maxsize is None:
+        maxsize = jobs * 4
+
+    work = queue.Queue()
+    out = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    lock = threading.Lock()
+    outstanding = [1]
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=_poll)
+                return
+            except queue.Full:
+                pass
+
+    def enqueue(subdirs):
+        with lock:
+            outstanding[0] += len(subdirs)
+
+        for subdir in subdirs:
+            work.put(subdir)
+
+    def worker():
+        while not stop.is_set():
+            try:
+                directory = work.get(timeout=_poll)
+            except queue.Empty:
+                continue
+
+            try:
+                children, subdirs = _list(directory, order, follow_stat, cache, onerror)
+                if order == 'topdown':
+                    put((directory, children))
+                    enqueue(subdirs)
+                else:
+                    enqueue(subdirs)
+                    put((directory, children))
+
+            except BaseException as e:
+                put(e)
+
+            finally:
+                with lock:
+                    outstanding[0] -= 1
+                    last = not outstanding[0]
+
+                if last:
+                    put(_done)
+
+    work.put(root)
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(jobs)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = out.get()
+            if item is _done:
+                break
+            elif isinstance(item, BaseException):
+                raise item
+
+            yield item
+
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+# fd relative removal
+
+_fd_functions = ({os.open, os.stat, os.unlink, os.rmdir} <= os.supports_dir_fd and
+                 os.scandir in os.supports_fd and
+                 os.stat in os.supports_follow_symlinks)
+_dir_flags = (os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) |
+              getattr(os, 'O_NOFOLLOW', 0) | getattr(os, 'O_CLOEXEC', 0))
+
+
+def _open_dir(parent_fd, name, path, onerror):
+    """ open name relative to parent_fd refusing to follow symlinks """
+    try:
+        st = os.stat(name, dir_fd=parent_fd, follow_symlinks=False)
+        fd = os.open(name, _dir_flags, dir_fd=parent_fd)
+    except OSError:
+        onerror(os.open, path, sys.exc_info())
+        return
+
+    if not os.path.samestat(st, os.fstat(fd)):
+        # swapped out from under us, do not follow it
+        os.close(fd)
+        try:
+            raise OSError('Cannot call rmtree on a symbolic link')
+        except OSError:
+            onerror(os.path.islink, path, sys.exc_info())
+
+        return
+
+    return fd
+
+
+def _unlink_files(fd, path, onerror, progress):
+    """ unlink everything in the directory open at fd that is not
+        a directory and return the names of the subdirectories """
+    try:
+        with os.scandir(fd) as it:
+            entries = list(it)
+    except OSError:
+        onerror(os.scandir, path, sys.exc_info())
+        return []
+
+    subdirs = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            is_dir = False
+
+        if is_dir:
+            subdirs.append(entry.name)
+        else:
+            try:
+                os.unlink(entry.name, dir_fd=fd)
+                progress()
+            except OSError:
+                onerror(os.unlink, path / entry.name, sys.exc_info())
+
+    return subdirs
+
+
+def _rmtree_at(parent_fd, name, path, onerror, progress):
+    fd = _open_dir(parent_fd, name, path, onerror)
+    if fd is None:
+        return
+
+    try:
+        for subdir in _unlink_files(fd, path, onerror, progress):
+            _rmtree_at(fd, subdir, path / subdir, onerror, progress)
+    finally:
+        os.close(fd)
+
+    try:
+        os.rmdir(name, dir_fd=parent_fd)
+        progress()
+    except OSError:
+        onerror(os.rmdir, path, sys.exc_info())
+
+
+def _noop():
+    pass
+
+
+def rmtree_contents(path, onerror, jobs=1, progress=None):
+    """ remove everything inside the directory path but not path itself
+
+        works relative to directory file descriptors so each entry costs
+        one unlink or rmdir and no path resolution, directories are opened
+        with O_NOFOLLOW and checked against their lstat so symlinks are
+        never traversed even if one is swapped in mid removal
+
+        onerror(func, path, exc_info) is called for every failure and
+        may raise to abort, jobs other than 1 expands the top of the tree
+        in the calling thread until there are enough subtrees to keep the
+        pool busy and then removes them concurrently, in which case
+        onerror may be called from the worker threads
+
+        progress() is called after each entry is removed
+
+        only available when os supports dir_fd, see _fd_functions """
+
+    if jobs is None:
+        jobs = default_jobs()
+
+    if progress is None:
+        progress = _noop
+
+    st = os.lstat(path)
+    fd = os.open(path, _dir_flags)
+    opened = [fd]
+    try:
+        if not os.path.samestat(st, os.fstat(fd)):
+            raise OSError('Cannot call rmtree on a symbolic link')
+
+        if jobs <= 1:
+            for subdir in _unlink_files(fd, path, onerror, progress):
+                _rmtree_at(fd, subdir, path / subdir, onerror, progress)
+
+            return
+
+        expanded = []
+        frontier = [(fd, subdir, path / subdir)
+                    for subdir in _unlink_files(fd, path, onerror, progress)]
+        while frontier and len(frontier) < jobs * 2:
+            next_frontier = []
+            for parent_fd, name, child in frontier:
+                child_fd = _open_dir(parent_fd, name, child, onerror)
+                if child_fd is None:
+                    continue
+
+                opened.append(child_fd)
+                expanded.append((parent_fd, name, child))
+                next_frontier.extend(
+                    (child_fd, subdir, child / subdir)
+                    for subdir in _unlink_files(child_fd, child, onerror, progress))
+
+            frontier = next_frontier
+
+        for _ in bounded_imap_unordered(
+                lambda args: _rmtree_at(*args, onerror, progress), frontier, jobs=jobs):
+            pass
+
+        for parent_fd, name, child in reversed(expanded):
+            try:
+                os.rmdir(name, dir_fd=parent_fd)
+                progress()
+            except OSError:
+                onerror(os.rmdir, child, sys.exc_info())
+
+    finally:
+        for fd in opened:
+            os.close(fd)
+
+
+# background removal
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def _background_executor():
+    """ removals run one at a time on a single shared thread, the
+        interpreter waits for pending removals before it exits """
+    global _background
+    with _background_lock:
+        if _background is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _background = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='augpathlib-rmtree')
+
+        return _background
+
+
+class BackgroundRemoval:
+    """ handle for rmtree(background=True)
+
+        path is the path that was removed from the namespace, trash is
+        the hidden sibling that it was renamed to and that is being
+        deleted, removed counts the entries deleted so far and errors
+        holds (func, path, exc_info) for every failure """
+
+    def __init__(self, path, trash):
+        self.path = path
+        self.trash = trash
+        self.removed = 0
+        self.errors = []
+        self.future = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        state = 'done' if self.done() else 'running'
+        return (f'<{self.__class__.__name__} {state} {self.path} '
+                f'removed={self.removed} errors={len(self.errors)}>')
+
+    def _progress(self):
+        with self._lock:
+            self.removed += 1
+
+    def _onerror(self, onerror):
+        def _onerror(func, path, exc_info):
+            self.errors.append((func, path, exc_info))
+            if onerror is not None:
+                onerror(func, path, exc_info)
+
+        return _onerror
+
+    def done(self):
+        return self.future.done()
+
+    def wait(self, timeout=None):
+        """ block until the removal finishes, raises if it was aborted
+            by an onerror that raised, returns self """
+        self.future.result(timeout)
+        return self
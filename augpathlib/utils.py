@@ -1,5 +1,4 @@
 import os
-import io
 import stat
 import base64
 import hashlib
@@ -35,6 +34,90 @@ cypher_command_lookup = {hashlib.sha256:'sha256sum',
 red = '\x1b[31m{}\x1b[0m'  # use as red.format(value)
 
 
+def default_jobs():
+    """ matches the ThreadPoolExecutor default, io bound work wants
+        more threads than there are cores """
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def bounded_imap_unordered(function, iterable, jobs=None, window=None):
+    """ map function over iterable on a pool of threads and yield
+        (item, result) pairs as they complete
+
+        at most window items are in flight at once so that huge
+        iterables (e.g. rchildren of a whole project) are consumed
+        lazily rather than being submitted all at once
+
+        jobs=None uses default_jobs(), jobs=1 runs serially in the
+        calling thread, if function raises then the error is raised
+        here and any work that has not started is cancelled """
+
+    if jobs is None:
+        jobs = default_jobs()
+
+    if jobs <= 1:
+        for item in iterable:
+            yield item, function(item)
+
+        return
+
+    if window is None:
+        window = jobs * 4
+
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    iterator = iter(iterable)
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    pending = {}
+    try:
+        while True:
+            for item in iterator:
+                pending[executor.submit(function, item)] = item
+                if len(pending) >= window:
+                    break
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                yield item, future.result()
+
+    finally:
+        for future in pending:
+            future.cancel()
+
+        executor.shutdown(wait=True)
+
+
+def _libc_function(name, syscall_numbers, argtypes):
+    """ ctypes function for the libc wrapper of a linux syscall if libc
+        has one (glibc >= 2.28 for statx and renameat2), otherwise call
+        it through syscall(2), syscall_numbers maps platform.machine()
+        to the syscall number, both return an int with errno set
+
+        raises NotImplementedError if neither is available """
+    import ctypes
+    import platform
+    libc = ctypes.CDLL(None, use_errno=True)
+    if hasattr(libc, name):
+        function = libc[name]
+        function.restype = ctypes.c_int
+        function.argtypes = argtypes
+        return function
+
+    # from /usr/include/asm/unistd*.h, the generic table is used by the newer arches
+    number = syscall_numbers.get(platform.machine())
+    if number is None:
+        msg = f'{name} syscall number unknown for {platform.machine()}'
+        raise NotImplementedError(msg)
+
+    syscall = libc['syscall']  # a fresh pointer so argtypes are not shared
+    syscall.restype = ctypes.c_long
+    syscall.argtypes = (ctypes.c_long, *argtypes)
+    return lambda *args: syscall(number, *args)
+
+
 def onerror_windows_readwrite_remove(action, name, exc):
     """ helper for deleting readonly files on windows """
     os.chmod(name, stat.S_IWRITE)
@@ -123,6 +206,8 @@ def _bind_sysid_(cls):
 
 class FileSize(int):
 
+    __slots__ = tuple()
+
     @classmethod
     def ofPath(cls, path):
         """ return size of a path alt FileSize.of(path) ? """
@@ -197,6 +282,12 @@ class StatResult:
 
 
 class etag:
+    """ incremental multipart etag, update accepts any bytes like
+        object of any length and only slices it via memoryview so
+        nothing is copied regardless of how the data is chunked
+
+        parts are independent digests so they can also be computed
+        separately, see part_ranges and from_part_digests """
 
     cypher = hashlib.md5
 
@@ -204,53 +295,43 @@ class etag:
         self.chunksize = chunksize
         self._m = self.cypher()
         self._parts = []
-        self._remainder = b''
-        self._last_chunksize = 0
+        self._filled = 0  # bytes of the current part seen so far
 
     def update(self, bytes_):
-        remainder, self._remainder = self._remainder, b''
-        bio = io.BytesIO(remainder + bytes_)  # inefficient for len(bytes_) << self.chunksize
-        while True:
-            if self._last_chunksize:
-                # in the event a restart is required only
-                # only read the number of bytes left for
-                # the current chunk to update self._m
-                chunksize = self.chunksize - self._last_chunksize
-                self._last_chunksize = 0
-            else:
-                chunksize = self.chunksize
-
-            chunk = self._remainder
-            self._remainder = bio.read(chunksize)
-            if not self._remainder:
-                # the second time around at the end this will break the loop if the chunk
-                # is exactly equal to the chunk size
-                if len(chunk) < chunksize:
-                    self._remainder = chunk
-                    return
-
-            if chunk:
-                self._m.update(chunk)  # empty remainder doesn't advance the function
-                digest = self._m.digest()
+        view = memoryview(bytes_).cast('B')
+        while view:
+            take = self.chunksize - self._filled
+            head, view = view[:take], view[take:]
+            self._m.update(head)
+            self._filled += len(head)
+            if self._filled == self.chunksize:
+                self._parts.append(self._m.digest())
                 self._m = self.cypher()
-                if chunksize < self.chunksize:
-                    # we are in a restart and need to update the last part with the
-                    # digest for the full chunksize
-                    self._parts[-1] = digest
-                else:
-                    self._parts.append(digest)
+                self._filled = 0
 
     def digest(self):
-        if self._remainder:
-            self._last_chunksize = len(self._remainder)  # in case someone calls an early digest
-            self._m.update(self._remainder)
-            self._parts.append(self._m.digest())  # do not overwrite self._m yet
-            self._remainder = b''  # this allows a stable call at the end
+        if self._filled:
+            # copy so that an early digest does not disturb the current part
+            parts = self._parts + [self._m.copy().digest()]
+        else:
+            parts = self._parts
 
-        m = self.cypher()
-        m.update(b''.join(self._parts))
-        return m.digest(), len(self._parts)
+        return self.from_part_digests(parts)
 
     def hexdigest(self):
         digest, count = self.digest()
         return f'{digest.hex()}-{count}'
+
+    @classmethod
+    def from_part_digests(cls, parts):
+        """ combine the digests of each part, in order, into
+            the same (digest, count) that digest returns """
+        m = cls.cypher()
+        m.update(b''.join(parts))
+        return m.digest(), len(parts)
+
+    @staticmethod
+    def part_ranges(size, chunksize):
+        """ (start, end) of every part of a file of size bytes """
+        return [(start, min(start + chunksize, size))
+                for start in range(0, size, chunksize)]
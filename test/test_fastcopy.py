@@ -0,0 +1,92 @@
+import os
+import unittest
+import pytest
+from augpathlib import fastcopy, LocalPath
+from .common import temp_path, onerror
+
+
+class TestFastCopy(unittest.TestCase):
+    def setUp(self):
+        self.dir = LocalPath(temp_path, 'fastcopy')
+        if self.dir.exists():
+            self.dir.rmtree(onerror=onerror)
+
+        self.dir.mkdir(parents=True)
+        self.source = self.dir / 'source'
+        self.target = self.dir / 'target'
+
+    def tearDown(self):
+        self.dir.rmtree(onerror=onerror)
+
+    def _check(self):
+        assert self.target.read_bytes() == self.source.read_bytes()
+        assert self.target.stat().st_size == self.source.stat().st_size
+
+    def test_copyfile(self):
+        self.source.write_bytes(os.urandom(3 * 1024 ** 2 + 17))
+        method = fastcopy.copyfile(self.source, self.target)
+        assert method in ('clone', 'copy_file_range', 'sendfile', 'readinto', 'read')
+        self._check()
+
+    def test_empty(self):
+        self.source.touch()
+        fastcopy.copyfile(self.source, self.target)
+        self._check()
+
+    def test_each_method(self):
+        self.source.write_bytes(os.urandom(2 * 1024 ** 2 + 5))
+        for name, function in fastcopy._methods:
+            if self.target.exists():
+                self.target.unlink()
+
+            with open(self.source, 'rb') as fs, open(self.target, 'wb') as ft:
+                size = os.fstat(fs.fileno()).st_size
+                assert function(fs.fileno(), ft.fileno(), 0, size) == size, name
+
+            self._check()
+
+    @pytest.mark.skipif(not hasattr(os, 'SEEK_DATA'), reason='no SEEK_DATA')
+    def test_sparse(self):
+        size = 64 * 1024 ** 2
+        with open(self.source, 'wb') as f:
+            f.seek(1024 ** 2)
+            f.write(b'data' * 1024)
+            f.truncate(size)
+
+        fastcopy.copyfile(self.source, self.target)
+        self._check()
+        st = self.target.stat()
+        assert st.st_blocks * 512 < size
+
+    def test_copy_to(self):
+        self.source.write_bytes(b'hello' * 10000)
+        self.source.copy_to(self.target)
+        self._check()
+
+    @pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason='no procfs')
+    def test_size_zero_special(self):
+        source = LocalPath('/proc/self/status')
+        assert source.stat().st_size == 0
+        assert fastcopy.copyfile(source, self.target) == 'stream'
+        assert self.target.read_bytes().startswith(b'Name:')
+        self.target.unlink()
+        source.copy_to(self.target)
+        assert self.target.read_bytes().startswith(b'Name:')
+
+    @pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason='no fifos')
+    def test_fifo(self):
+        import threading
+        data = os.urandom(3 * 1024 ** 2 + 17)
+        os.mkfifo(self.source)
+        def write():
+            with open(self.source, 'wb') as f:
+                f.write(data)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            self.source.copy_to(self.target)
+        finally:
+            thread.join()
+
+        assert self.target.read_bytes() == data
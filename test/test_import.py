@@ -0,0 +1,39 @@
+import sys
+import json
+import unittest
+import subprocess
+
+# modules that are only needed once a specific feature is used
+deferred = ('magic', 'dateutil', 'terminaltables3', 'git', 'requests',
+            'pexpect', 'asyncio', 'augpathlib.aio', 'augpathlib.zip',
+            'augpathlib.repo', 'augpathlib.package', 'augpathlib.metatable', 'numpy')
+
+script = '''
+import sys, json
+import augpathlib
+print(json.dumps({'modules': sorted(sys.modules)}))
+'''
+
+
+def run(code):
+    out = subprocess.check_output([sys.executable, '-c', code])
+    return json.loads(out)
+
+
+class TestImport(unittest.TestCase):
+    def test_deferred(self):
+        modules = set(run(script)['modules'])
+        bad = [m for m in deferred if m in modules]
+        assert not bad, bad
+
+    def test_lazy_attributes(self):
+        code = ('import sys, json, augpathlib\n'
+                'augpathlib.ZipPath\n'
+                'augpathlib.PackagePath\n'
+                'print(json.dumps({"zip": "augpathlib.zip" in sys.modules}))\n')
+        assert run(code)['zip']
+
+    def test_missing(self):
+        import augpathlib
+        with self.assertRaises(AttributeError):
+            augpathlib.NotAThing
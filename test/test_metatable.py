@@ -0,0 +1,107 @@
+import unittest
+from datetime import datetime, timezone
+from augpathlib import PathMeta, PathMetaTable
+from augpathlib import metatable
+
+t0 = datetime(2020, 1, 1, tzinfo=timezone.utc)
+t1 = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+def metas():
+    return [PathMeta(id='a', name='a.txt', size=10, checksum=b'aa', updated=t0),
+            PathMeta(id='b', name='b.txt', size=2000, checksum=b'bb', updated=t1),
+            PathMeta(id='c', name='c.txt', size=None, updated=datetime(2020, 6, 1)),
+            PathMeta(id='d', name='d.txt', size=500, updated=1600000000, errors=('oops',)),
+            PathMeta(id='e', name='a.txt', size=10, checksum=b'aa', created=t0, custom=1)]
+
+
+class TestPathMetaTable(unittest.TestCase):
+    numpy = False
+
+    def setUp(self):
+        self.metas = metas()
+        self.table = PathMetaTable(self.metas, numpy=self.numpy)
+
+    def test_roundtrip(self):
+        assert len(self.table) == len(self.metas)
+        assert list(self.table) == self.metas
+        assert [type(m.updated) for m in self.table] == [type(m.updated) for m in self.metas]
+        assert self.table[-1]._PathMeta__kwargs == {'custom': 1}
+        assert self.table[3].errors == ('oops',)
+        with self.assertRaises(IndexError):
+            self.table[len(self.metas)]
+
+    def test_pooled(self):
+        # the same name is only stored once
+        assert self.table._pool.count('a.txt') == 1
+        assert self.table.values('name') == [m.name for m in self.metas]
+
+    def test_where(self):
+        assert list(self.table.where_size(min=10, max=600)) == [0, 3, 4]
+        assert list(self.table.where_size(min=1000)) == [1]
+        assert list(self.table.where_checksum(b'aa')) == [0, 4]
+        assert list(self.table.where_checksum(b'zz')) == []
+        assert list(self.table.where('name', 'a.txt')) == [0, 4]
+        assert list(self.table.where_updated_after(t0)) == [1, 2, 3]
+        assert list(self.table.where_updated_after(datetime(2020, 7, 1))) == [1, 3]
+        with self.assertRaises(ValueError):
+            self.table.where('size', 10)
+
+    def test_take(self):
+        sub = self.table[self.table.where_checksum(b'aa')]
+        assert list(sub) == [self.metas[0], self.metas[4]]
+        assert sub[1]._PathMeta__kwargs == {'custom': 1}
+        assert list(self.table[1:3]) == self.metas[1:3]
+
+    def test_ids(self):
+        assert self.table.row_of('c') == 2
+        assert 'e' in self.table
+        assert 'z' not in self.table
+        with self.assertRaises(KeyError):
+            self.table.row_of('z')
+
+    def test_join_changed(self):
+        new = [PathMeta(id='e', name='a.txt', size=10, checksum=b'aa', created=t0, custom=1),
+               PathMeta(id='z', name='z.txt', size=1),
+               PathMeta(id='a', name='a.txt', size=10, checksum=b'cc', updated=t0),
+               PathMeta(id='b', name='b.txt', size=2000, checksum=b'bb', updated=t0),
+               PathMeta(id='d', name='d.txt', size=500, updated=1600000001),
+               PathMeta(id='c', name='c.txt', size=None, updated=datetime(2020, 6, 1))]
+        other = PathMetaTable(new, numpy=self.numpy)
+        left, right = self.table.join(other)
+        assert sorted(zip(left, right)) == [(0, 2), (1, 3), (2, 5), (3, 4), (4, 0)]
+        # a has a new checksum, d has a new updated and no checksum,
+        # b only has a new updated but its checksum did not change
+        assert list(self.table.changed(other)) == [0, 3]
+        assert list(other.changed(self.table)) == [2, 4]
+        assert list(self.table.changed(self.table)) == []
+
+    def test_shared_pool(self):
+        sub = self.table.take([4, 0])
+        assert sub._pool is self.table._pool
+        assert sorted(zip(*sub.join(self.table))) == [(0, 4), (1, 0)]
+
+    def test_empty(self):
+        table = PathMetaTable(numpy=self.numpy)
+        assert len(table) == 0
+        assert list(table.where_size(min=0)) == []
+        assert list(table.join(self.table)[0]) == []
+
+
+@unittest.skipIf(metatable._np is None, 'numpy is not installed')
+class TestPathMetaTableNumpy(TestPathMetaTable):
+    numpy = True
+
+    def test_backend(self):
+        assert isinstance(self.table.where_size(min=0), metatable._np.ndarray)
+        # the views do not copy the columns
+        view = self.table._view('size')
+        self.table._columns['size'][0] = 11
+        assert view[0] == 11
+
+
+class TestPathMetaTableImport(unittest.TestCase):
+    def test_no_numpy(self):
+        if metatable._np is None:
+            with self.assertRaises(ModuleNotFoundError):
+                PathMetaTable(numpy=True)
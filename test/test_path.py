@@ -1,15 +1,18 @@
 import os
 import sys
+import shutil
 import unittest
 from pathlib import PurePosixPath
 import pytest
 from augpathlib import swap
+from augpathlib import ranges
 from augpathlib import exceptions as exc
 from augpathlib import AugmentedPath, LocalPath
-from augpathlib import SymlinkCache, PrimaryCache
-from augpathlib import PathMeta
+from augpathlib import SymlinkCache, PrimaryCache, EatCache
 from augpathlib import PathMeta
+from augpathlib import PathMeta, FrozenPathMeta
 from augpathlib.meta import _PathMetaAsSymlink, _PathMetaAsXattrs
+from augpathlib.utils import default_cypher
 from .common import (log,
                      onerror,
                      project_path,
@@ -52,6 +55,22 @@ class Helper:
             self.test_path.rmtree(onerror=onerror)
 
 
+class FileHelper(Helper):
+    """ test_path containing a single file with file_bytes() in it """
+
+    file_name = 'file'
+
+    def file_bytes(self):
+        return b''
+
+    def setUp(self):
+        super().setUp()
+        self.test_path.mkdir()
+        self.file = LocalPath(self.test_path, self.file_name)
+        self.bytes = self.file_bytes()
+        self.file.write_bytes(self.bytes)
+
+
 class TestAugPath(Helper, unittest.TestCase):
 
     def test_is_dir_symlink(self):
@@ -175,6 +194,60 @@ class TestMimetype(Helper, unittest.TestCase):
         mmt = self.tf._magic_mimetype
         assert mmt == 'text/plain', mmt
 
+    def test_mimetypes_for(self):
+        from augpathlib.mime import mimetypes_for
+        noext = self.test_path / 'no-extension'
+        noext.write_bytes(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        d = self.test_path / 'dir'
+        d.mkdir()
+        paths = [self.tf, noext, d]
+        test = dict(mimetypes_for(paths, jobs=2))
+        assert test == {self.tf: 'text/plain',
+                        noext: 'application/pdf',
+                        d: 'inode/directory'}, test
+
+    def test_magic_cache(self):
+        from augpathlib import mime
+        st = self.tf.stat()
+        key = st.st_dev, st.st_ino, st.st_mtime_ns
+        mime._cache[key] = 'fake/cached'
+        try:
+            assert self.tf._magic_mimetype == 'fake/cached'
+        finally:
+            mime._cache.pop(key)
+
+    def test_file_magic_binding(self):
+        # the sys-apps/file binding also has a Magic class but no from_file
+        import types
+        import threading
+        from unittest import mock
+        from augpathlib import mime
+        class Cookie:
+            def load(self):
+                pass
+
+            def file(self, path):
+                return 'fake/file-magic'
+
+        class Magic:
+            def __init__(self, ms):
+                pass
+
+        fake = types.ModuleType('magic')
+        fake.Magic = Magic
+        fake.MAGIC_MIME_TYPE = 16
+        fake.open = lambda flags: Cookie()
+        result = []
+        def detect():  # detectors are per thread
+            result.append(mime._detector()(os.fspath(self.tf)))
+
+        with mock.patch.dict(sys.modules, magic=fake):
+            thread = threading.Thread(target=detect)
+            thread.start()
+            thread.join()
+
+        assert result == ['fake/file-magic']
+
 
 class TestAugPathCopy(Helper, unittest.TestCase):
 
@@ -279,6 +352,11 @@ class TestAugPathSwap(Helper, unittest.TestCase):
     def test_swap(self):
         self._doit(lambda :self.source_d.swap(self.target_d))
 
+    @pytest.mark.skipif(sys.platform != 'linux', reason='not implemented')
+    def test_swap_pathlib_target(self):
+        import pathlib
+        self._doit(lambda :self.source_d.swap(pathlib.Path(self.target_d)))
+
     def test_swap_carefree(self):
         self._doit(lambda :self.source_d.swap_carefree(self.target_d))
 
@@ -401,6 +479,24 @@ class TestPathMeta(unittest.TestCase):
         #'\n'.join([str((getattr(pm, field), getattr(new_pm, field)))
         #for field in _PathMetaAsXattrs.fields])
 
+    def test_packed_roundtrip(self):
+        pm = self.path.meta
+        blob = pm.as_packed(self.prefix)
+        new_pm = PathMeta.from_packed(blob, self.prefix)
+        assert new_pm == PathMeta.from_xattrs(pm.as_xattrs(self.prefix), self.prefix)
+
+    def test_packed_corrupt(self):
+        blob = PathMeta(id='lol', size=10).as_packed()
+        for bad in (b'nope' + blob, blob[:3] + b'\xff' + blob[4:], blob[:-1]):
+            with self.assertRaises(exc.MetadataCorruptionError):
+                PathMeta.from_packed(bad)
+
+    def test_xattrs_reserved(self):
+        # bookkeeping keys e.g. an old checksum memo are not meta fields
+        xattrs = PathMeta(id='lol').as_xattrs(self.prefix)
+        xattrs[b'augpathlib.checksum.blake2b'] = b'\x00' * 8
+        assert PathMeta.from_xattrs(xattrs, self.prefix) == PathMeta(id='lol')
+
     def test_metastore_roundtrip(self):
         pm = self.path.meta
         ms = pm.as_metastore(self.prefix)
@@ -491,6 +587,144 @@ class TestPrefixEvil(TestPathMeta):
     prefix = 'prefix.'
 
 
+class TestPathMetaSlots(unittest.TestCase):
+    def meta(self, cls=PathMeta, **kwargs):
+        return cls(id='N:package:1', size=10, checksum=b'\x01' * 32,
+                   created='2020-01-01T00:00:00Z', updated='2020-01-02T00:00:00,5Z',
+                   errors=('a',), **kwargs)
+
+    def test_pickle(self):
+        import pickle
+        for pm in (self.meta(), self.meta(FrozenPathMeta), PathMeta()):
+            new_pm = pickle.loads(pickle.dumps(pm))
+            assert type(new_pm) == type(pm)
+            assert new_pm == pm
+            assert list(new_pm.items()) == list(pm.items())
+
+    def test_unparsed_equal(self):
+        pm = self.meta()
+        assert pm == self.meta()
+        pm.created  # parsed on one side only
+        assert pm == self.meta()
+
+    def test_frozen(self):
+        fpm = FrozenPathMeta.freeze(self.meta())
+        assert fpm == self.meta()
+        assert hash(fpm) == hash(self.meta(FrozenPathMeta))
+        assert len({fpm, self.meta(FrozenPathMeta), FrozenPathMeta()}) == 2
+        with self.assertRaises(AttributeError):
+            fpm.id = 'N:package:2'
+
+        pm = fpm.thaw()
+        pm.id = 'N:package:2'
+        assert pm != fpm
+
+        with self.assertRaises(TypeError):
+            hash(pm)
+
+    def test_memory(self):
+        import tracemalloc
+        from augpathlib.utils import FileSize
+
+        class Dicty:
+            def __init__(self, pm):
+                for k, v in pm._field_items():
+                    setattr(self, k, FileSize(v) if k == 'size' else v)
+
+                self._created = pm._created
+                self._updated = pm._updated
+                self._created_ok = self._updated_ok = None
+
+        def per_instance(make, n=10000):
+            tracemalloc.start()
+            try:
+                before = tracemalloc.get_traced_memory()[0]
+                instances = [make() for _ in range(n)]
+                return (tracemalloc.get_traced_memory()[0] - before) / n
+            finally:
+                tracemalloc.stop()
+
+        pm = self.meta()
+        slotted = per_instance(lambda: PathMeta(**pm._kwargs()))
+        dicty = per_instance(lambda: Dicty(pm))
+        log.debug(f'PathMeta {slotted} bytes vs {dicty} bytes with a __dict__')
+        assert not hasattr(pm, '__dict__')
+        # newer pythons have much smaller instance dicts so only check
+        # that we are never worse and stay under a fixed ceiling
+        assert slotted <= dicty and slotted < 256, (slotted, dicty)
+
+
+class TestMetastore(unittest.TestCase):
+    # produced by the pickle based as_metastore, must keep loading
+    legacy = (b'\x80\x04\x95)\x01\x00\x00\x00\x00\x00\x00}\x94(C\x04name\x94C\thello.txt\x94C\x04size\x94C\x041234\x94C\x07created\x94C\x1b2020-01-02T03:04:05,678901Z\x94C\x07updated\x94C\x142021-02-03T04:05:06Z\x94C\x08checksum\x94C\x06\x00\x01abc\xff\x94C\x0fchecksum_cypher\x94C\x06sha256\x94C\x04etag\x94C\x061234-3\x94C\tchunksize\x94C\x044096\x94C\tparent_id\x94C\x05N:p:1\x94C\x02id\x94C\x05N:i:2\x94C\x07file_id\x94C\x017\x94C\x03gid\x94C\x03100\x94C\x07user_id\x94C\x041000\x94C\x04mode\x94C\x03644\x94C\x06errors\x94C\x03a;b\x94u.')
+    legacy_prefix = (b'\x80\x04\x95t\x01\x00\x00\x00\x00\x00\x00}\x94(C\ttest.name\x94C\thello.txt\x94C\ttest.size\x94C\x041234\x94C\x0ctest.created\x94C\x1b2020-01-02T03:04:05,678901Z\x94C\x0ctest.updated\x94C\x142021-02-03T04:05:06Z\x94C\rtest.checksum\x94C\x06\x00\x01abc\xff\x94C\x14test.checksum_cypher\x94C\x06sha256\x94C\ttest.etag\x94C\x061234-3\x94C\x0etest.chunksize\x94C\x044096\x94C\x0etest.parent_id\x94C\x05N:p:1\x94C\x07test.id\x94C\x05N:i:2\x94C\x0ctest.file_id\x94C\x017\x94C\x08test.gid\x94C\x03100\x94C\x0ctest.user_id\x94C\x041000\x94C\ttest.mode\x94C\x03644\x94C\x0btest.errors\x94C\x03a;b\x94u.')
+
+    @staticmethod
+    def meta():
+        from datetime import datetime, timezone
+        kwargs = dict(name='hello.txt', size=1234,
+                      created=datetime(2020, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+                      updated=datetime(2021, 2, 3, 4, 5, 6, tzinfo=timezone.utc),
+                      checksum=b'\x00\x01abc\xff', checksum_cypher='sha256',
+                      etag=(b'\x12\x34', 3), chunksize=4096, parent_id='N:p:1',
+                      id='N:i:2', file_id=7, gid=100, user_id=1000, mode='644',
+                      errors=('a', 'b'))
+        return PathMeta(**kwargs)
+
+    def test_legacy(self):
+        pm = self.meta()
+        assert PathMeta.from_metastore(self.legacy) == pm
+        assert PathMeta.from_metastore(self.legacy_prefix, 'test') == pm
+        # and they survive being rewritten in the new format
+        new = PathMeta.from_metastore(self.legacy).as_metastore()
+        assert not new.startswith(b'\x80')
+        assert PathMeta.from_metastore(new) == pm
+
+    def test_types(self):
+        from datetime import datetime, timedelta, timezone
+        est = timezone(timedelta(hours=-5))
+        pm = self.meta()
+        pm.user_id = 'someone'
+        pm._created = datetime(1969, 7, 20, 20, 17, 40, 1, tzinfo=est)
+        pm._updated = datetime(2020, 1, 1)  # naive stays naive
+        new = PathMeta.from_metastore(pm.as_metastore())
+        assert new == pm
+        for field in ('created', 'updated', 'user_id', 'etag', 'errors', 'size'):
+            assert type(getattr(new, field)) == type(getattr(pm, field)), field
+
+        assert new.created.utcoffset() == est.utcoffset(None)
+        assert new.updated.tzinfo is None
+        assert PathMeta.from_metastore(PathMeta().as_metastore()) == PathMeta()
+
+    def test_unparsed(self):
+        pm = PathMeta(id='lol', updated='2020-01-02T03:04:05Z')
+        new = PathMeta.from_metastore(pm.as_metastore())
+        assert new._updated == '2020-01-02T03:04:05Z'
+        assert new == pm
+
+    def test_bulk(self):
+        pms = [self.meta(), PathMeta(id='a'), PathMeta(size=0, errors=('x',))]
+        blobs = PathMeta.as_metastores(pms)
+        assert PathMeta.from_metastores(blobs) == pms
+        assert PathMeta.from_metastores([self.legacy] + blobs) == [pms[0]] + pms
+
+    def test_corrupt(self):
+        blob = self.meta().as_metastore()
+        for bad in (b'nope' + blob, blob[:3] + b'\xff' + blob[4:],
+                    blob[:-1], blob + b'\x00', blob[:8] + b'\xee' + blob[9:]):
+            with self.assertRaises(exc.MetadataCorruptionError):
+                PathMeta.from_metastore(bad)
+
+    def test_legacy_no_globals(self):
+        import pickle
+        evil = pickle.dumps({b'id': PurePosixPath('/etc/passwd')})
+        with self.assertRaises(exc.MetadataCorruptionError):
+            PathMeta.from_metastore(evil)
+
+        with self.assertRaises(exc.MetadataCorruptionError):
+            PathMeta.from_metastore(pickle.dumps([b'id']))
+
+
 class TestContext(unittest.TestCase):
     def setUp(self):
         if not temp_path.exists():
@@ -544,3 +778,1188 @@ class TestActuallyLocalPath(unittest.TestCase):
         p = lp.parent
         rc = list(p.rchildren)
         assert rc, 'hrm'
+
+
+class TestChecksumTree(Helper, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_path = LocalPath(self.test_path)
+        self.test_path.mkdir()
+        for i, rel in enumerate(('a', 'b/c', 'b/d/e', 'f/g')):
+            path = self.test_path / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(str(i).encode() * (i * 3000))
+
+    def test_checksum_tree(self):
+        expect = {p: p.checksum() for p in self.test_path.rchildren if p.is_file()}
+        test = dict(self.test_path.checksum_tree(jobs=4))
+        assert test == expect
+
+    def test_checksum_tree_serial_extra(self):
+        from hashlib import sha256
+        expect = {p: p.checksum(extra_cyphers=(sha256,))
+                  for p in self.test_path.rchildren if p.is_file()}
+        test = dict(self.test_path.checksum_tree(extra_cyphers=(sha256,), jobs=1))
+        assert test == expect
+
+    def test_checksum_tree_file(self):
+        f = self.test_path / 'a'
+        assert list(f.checksum_tree()) == [(f, f.checksum())]
+
+
+class TestChecksumMemo(FileHelper, unittest.TestCase):
+    file_name = 'memo-file'
+
+    def file_bytes(self):
+        return b'some data' * 1000
+
+    def setUp(self):
+        super().setUp()
+        self.store = {}
+        LocalPath.memoize_checksums = True
+        LocalPath.checksum_memo_store = self.store
+
+    def tearDown(self):
+        LocalPath.memoize_checksums = False
+        LocalPath.checksum_memo_store = None
+        super().tearDown()
+
+    def test_memo_reused(self):
+        checksum = self.file._checksum_memoized()
+        assert checksum == self.file.checksum()
+        key, = self.store
+        # swap in a fake digest, a fresh path object should return it
+        fake = b'\x00' * len(checksum)
+        self.store[key] = fake
+        new = LocalPath(self.file)
+        assert new.meta.checksum == fake
+
+    def test_memo_invalidated(self):
+        checksum = self.file._checksum_memoized()
+        with open(self.file, 'ab') as f:
+            f.write(b'more')
+
+        new_checksum = LocalPath(self.file)._checksum_memoized()
+        assert new_checksum != checksum
+        assert new_checksum == self.file.checksum()
+
+    def test_memo_ctime(self):
+        # same size rewrite that puts mtime back e.g. rsync --inplace -t
+        st = self.file.stat()
+        checksum = self.file._checksum_memoized()
+        with open(self.file, 'r+b') as f:
+            f.write(b'SOME')
+
+        os.utime(self.file, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert self.file.stat().st_mtime_ns == st.st_mtime_ns
+        new_checksum = LocalPath(self.file)._checksum_memoized()
+        assert new_checksum != checksum
+        assert new_checksum == self.file.checksum()
+
+    def test_memo_read_only(self):
+        # reading meta must never write to the file
+        st = self.file.stat()
+        self.file.meta
+        assert self.file.stat().st_ctime_ns == st.st_ctime_ns
+        if os.name != 'nt':
+            assert not [k for k in self.file.xattrs() if k.startswith(b'augpathlib.')]
+
+    def test_memo_off(self):
+        LocalPath.memoize_checksums = False
+        self.file.meta
+        assert not self.store
+
+    def test_memo_fallback_stat(self):
+        from augpathlib import statx
+        if not statx.available():
+            pytest.skip('no statx')
+
+        st = statx.statx(self.file)
+        assert hasattr(st, 'st_mtime_ns')
+        assert not self.file._checksum_memo_ok(default_cypher, st)
+        assert self.file._checksum_memo_ok(default_cypher, self.file.stat())
+
+    def test_memo_lru(self):
+        from augpathlib.core import _LruMemo
+        lru = _LruMemo(2)
+        lru['a'] = 1
+        lru['b'] = 2
+        lru.get('a')
+        lru['c'] = 3
+        assert lru.get('b') is None and lru.get('a') == 1 and len(lru) == 2
+
+
+class TestDataViews(FileHelper, unittest.TestCase):
+    file_name = 'views-file'
+
+    def file_bytes(self):
+        return bytes(range(256)) * 5000
+
+    def test_views(self):
+        assert b''.join(bytes(v) for v in self.file.data_views(chunksize=4096)) == self.bytes
+        assert b''.join(bytes(v) for v in self.file.data_views()) == self.bytes
+
+    def test_views_mmap(self):
+        test = b''.join(bytes(v) for v in self.file.data_views(chunksize=10000, mmap=True))
+        assert test == self.bytes
+
+    def test_views_empty(self):
+        empty = LocalPath(self.test_path, 'empty')
+        empty.touch()
+        assert list(empty.data_views()) == []
+        assert list(empty.data_views(mmap=True)) == []
+
+    def test_views_released(self):
+        gen = self.file.data_views(chunksize=4096)
+        first = next(gen)
+        next(gen)
+        try:
+            bytes(first)
+            raise AssertionError('view should have been released')
+        except ValueError:
+            pass
+        finally:
+            gen.close()
+
+    def test_consumers(self):
+        assert self.file.checksum(zero_copy=True) == self.file.checksum()
+        assert self.file.etag(8192, zero_copy=True) == self.file.etag(8192)
+        target = LocalPath(self.test_path, 'views-copy')
+        self.file.copy_to(target)
+        assert target.checksum() == self.file.checksum()
+
+    def test_copy_overridden_setter(self):
+        kept = []
+
+        class Keeper(LocalPath):
+            fast_copy = False
+
+            @LocalPath.data.setter
+            def data(self, generator):
+                kept.extend(generator)  # holds on to every chunk
+
+        Keeper._bind_flavours()
+        source = Keeper(self.file)
+        source.copy_to(Keeper(self.test_path, 'kept'))
+        assert all(isinstance(chunk, bytes) for chunk in kept)
+        assert b''.join(kept) == self.bytes
+
+    def test_copy_views_no_fast_copy(self):
+        class Slow(LocalPath):
+            fast_copy = False
+
+        Slow._bind_flavours()
+        target = Slow(self.test_path, 'slow-copy')
+        Slow(self.file).copy_to(target)
+        assert target.checksum() == self.file.checksum()
+
+
+class TestDigests(FileHelper, unittest.TestCase):
+    file_name = 'digests-file'
+
+    def file_bytes(self):
+        return bytes(range(256)) * 3000
+
+    def test_digests(self):
+        import hashlib
+        checksum, extra, etag = self.file.digests(
+            extra_cyphers=(hashlib.sha256, hashlib.md5), etag_chunksize=8192)
+        assert checksum == self.file.checksum()
+        assert extra == (self.file.checksum(hashlib.sha256),
+                         self.file.checksum(hashlib.md5))
+        assert etag == self.file.etag(8192)
+
+    def test_digests_no_etag(self):
+        checksum, extra, etag = self.file.digests()
+        assert checksum == self.file.checksum()
+        assert extra == tuple()
+        assert etag is None
+
+    def test_meta_chunksize(self):
+        meta = self.file._meta_maker(chunksize=8192)
+        assert meta.checksum == self.file.checksum()
+        assert meta.etag == self.file.etag(8192)
+
+    def test_etag_parallel(self):
+        for chunksize in (8192, 768000, 10 ** 6):
+            assert self.file.etag(chunksize, jobs=4) == self.file.etag(chunksize)
+
+    def test_data_ranges_exact_chunksize(self):
+        data = b''.join(self.file._data(ranges=((0, 4096),), chunksize=4096))
+        assert data == self.file.read_bytes()[:4096]
+
+
+class TestDataRanges(FileHelper, unittest.TestCase):
+    file_name = 'ranges-file'
+
+    def file_bytes(self):
+        return os.urandom(100000)
+
+    def _read(self, *ranges, chunksize=None):
+        return [b''.join(self.file._data(ranges=(r,), chunksize=chunksize))
+                for r in ranges]
+
+    def test_slice_semantics(self):
+        rs = ((0, 10), (-100, None), (10, -10), (99990, 200000), (500, 400), (0, None))
+        b = self.bytes
+        assert self._read(*rs) == [b[:10], b[-100:], b[10:-10], b[99990:], b'', b]
+
+    def test_request_order(self):
+        rs = [(50000, 50010), (0, 5), (3, 8), (60000, 60001), (4, 5), (0, 5)]
+        data = b''.join(self.file._data(ranges=rs))
+        assert data == b''.join(self.bytes[s:e] for s, e in rs)
+
+    def test_chunked(self):
+        chunks = list(self.file._data(ranges=((1, 10001),), chunksize=4096))
+        assert [len(c) for c in chunks] == [4096, 4096, 1808]
+        assert b''.join(chunks) == self.bytes[1:10001]
+
+    def test_streamed(self):
+        with open(self.file, 'rb') as f:
+            chunks = list(ranges.read_ranges(
+                f.fileno(), ((5, 90000), (10, 20)), 4096, block_max=1000))
+
+        assert b''.join(chunks) == self.bytes[5:90000] + self.bytes[10:20]
+
+    def test_coalesce(self):
+        spans = [(10000, 10010), (0, 10), (30, 40), (5, 20), (0, 5)]
+        blocks = ranges.coalesce(spans, gap=10)
+        assert [(s, e) for s, e, _ in blocks] == [(0, 40), (10000, 10010)]
+        assert sorted(blocks[0][2]) == [1, 2, 3, 4]
+        blocks = ranges.coalesce([(10, 20), (0, 10)], gap=0, block_max=15)
+        assert blocks == [(0, 10, [1]), (10, 20, [0])]
+        assert ranges.coalesce([(0, 100)], block_max=10) == [(0, 100, [0])]
+
+    def _counting(self):
+        reads = []
+        originals = ranges._read_into, ranges._pread
+        def read_into(fd, buffer, size, offset):
+            reads.append(size)
+            return originals[0](fd, buffer, size, offset)
+
+        def pread(fd, size, offset):
+            reads.append(size)
+            return originals[1](fd, size, offset)
+
+        ranges._read_into, ranges._pread = read_into, pread
+        self.addCleanup(setattr, ranges, '_read_into', originals[0])
+        self.addCleanup(setattr, ranges, '_pread', originals[1])
+        return reads
+
+    def test_any_order(self):
+        # many small samples in arbitrary order are coalesced
+        import random
+        reads = self._counting()
+        rs = [(i, i + 10) for i in range(0, 100000 - 10, 97)]
+        random.shuffle(rs)
+        data = list(self.file._data(ranges=rs))
+        assert data == [self.bytes[s:e] for s, e in rs]
+        assert len(reads) == 1
+
+    def test_bounded(self):
+        # windows never hold or read more than block_max
+        reads = self._counting()
+        rs = [(i, i + 10) for i in range(0, 100000, 1000)][::-1]
+        with open(self.file, 'rb') as f:
+            gen = ranges.read_ranges(f.fileno(), rs, 4096, gap=1000, block_max=8192,
+                                     window_max=5)
+            assert next(gen) == self.bytes[rs[0][0]:rs[0][1]]
+            assert sum(reads) <= 8192
+            rest = list(gen)
+
+        assert b''.join(rest) == b''.join(self.bytes[s:e] for s, e in rs[1:])
+        assert max(reads) <= 8192
+        reads.clear()
+        list(self.file._data(chunksize=4096))
+        assert max(reads) == 4096  # a whole file is streamed
+
+    def test_grown(self):
+        with open(self.file, 'rb') as f:
+            gen = ranges.read_ranges(f.fileno(), ((0, None),), 4096)
+            first = next(gen)
+            with open(self.file, 'ab') as g:
+                g.write(b'more')
+
+            assert first + b''.join(gen) == self.bytes + b'more'
+
+    @pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason='no procfs')
+    def test_size_zero_special(self):
+        proc = LocalPath('/proc/self/status')
+        assert proc.stat().st_size == 0
+        data = b''.join(proc._data())
+        assert data.startswith(b'Name:')
+        assert b''.join(proc._data(ranges=((0, 5),))) == b'Name:'
+        with self.assertRaises(ValueError):
+            list(proc._data(ranges=((-5, None),)))
+
+    @pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason='no fifos')
+    def test_fifo(self):
+        import threading
+        fifo = LocalPath(self.test_path, 'fifo')
+        os.mkfifo(fifo)
+        def write():
+            with open(fifo, 'wb') as f:
+                f.write(self.bytes)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            assert b''.join(fifo._data(chunksize=4096)) == self.bytes
+        finally:
+            thread.join()
+
+    def test_bad_range(self):
+        with self.assertRaises(ValueError):
+            list(self.file._data(ranges=(5,)))
+
+        with self.assertRaises(TypeError):
+            list(self.file._data(ranges=((0.5, 10),)))
+
+
+class EatCacheTest(EatCache):
+    xattr_prefix = 'test'
+
+
+EatCacheTest._bind_flavours()
+
+
+class TestPackedCacheMeta(FileHelper, unittest.TestCase):
+    file_name = 'packed-file'
+
+    def setUp(self):
+        super().setUp()
+        self.cache = EatCacheTest(self.file)
+        self.meta = PathMeta(id='N:package:1', size=10, checksum=b'\x01' * 32,
+                             etag=(b'\x02' * 16, 3), chunksize=4096, errors=('a', 'b'))
+
+    def test_packed(self):
+        self.cache._meta_setter(self.meta)
+        assert list(self.file.xattrs()) == [b'augpathlib.test.meta']
+        assert self.cache.meta == self.meta
+
+    def test_read_per_field(self):
+        self.file.setxattrs(self.meta.as_xattrs('test'))
+        assert self.cache.meta == self.meta
+
+    def test_packed_preferred(self):
+        self.file.setxattrs(PathMeta(id='N:package:old').as_xattrs('test'))
+        self.cache._meta_setter(self.meta)
+        assert self.cache.meta == self.meta
+
+    def test_packed_drops_per_field(self):
+        old = PathMeta(id='N:package:old', size=99, created='2000-01-01T00:00:00Z',
+                       updated='2000-01-01T00:00:00Z')
+        assert b'test.created' in old.as_xattrs('test')
+        self.file.setxattrs(old.as_xattrs('test'))
+        self.file.setxattr(b'other.size', b'99')
+        self.cache._meta_setter(self.meta)
+        assert sorted(self.file.xattrs()) == [b'augpathlib.test.meta', b'other.size']
+        self.file.delxattr(b'augpathlib.test.meta')
+        assert not self.cache.meta  # nothing stale to fall back to
+
+    def test_unpacked(self):
+        self.cache._meta_setter(self.meta)
+        self.cache.xattr_packed = False
+        self.cache._meta_setter(self.meta)
+        assert b'augpathlib.test.meta' not in self.file.xattrs()
+        assert self.cache.meta == self.meta
+
+
+class TestAtomicData(FileHelper, unittest.TestCase):
+    file_name = 'atomic-file'
+
+    def file_bytes(self):
+        return b'original'
+
+    def setUp(self):
+        super().setUp()
+        self.file.data_atomic = True
+
+    def _leftovers(self):
+        return [c for c in self.test_path.iterdir() if c.name.startswith('.')]
+
+    def test_replace(self):
+        os.chmod(self.file, 0o640)
+        self.file.setxattr(b'test.key', b'value')
+        self.file.data = iter([b'new ', b'data'])
+        assert self.file.read_bytes() == b'new data'
+        assert self.file.stat().st_mode & 0o777 == 0o640
+        assert self.file.getxattr(b'test.key') == b'value'
+        assert not self._leftovers()
+
+    def test_failed_write_keeps_original(self):
+        def gen():
+            yield b'partial'
+            raise ValueError('fetch failed')
+
+        with self.assertRaises(ValueError):
+            self.file.data = gen()
+
+        assert self.file.read_bytes() == b'original'
+        assert not self._leftovers()
+
+    def test_preallocate(self):
+        for size in (3, 4096 * 10):  # short and long guesses
+            self.file._write_chunks_atomic(iter([b'abc', b'def']), size)
+            assert self.file.read_bytes() == b'abcdef'
+
+    def test_durability(self):
+        for durability in LocalPath.data_durabilities:
+            self.file.data_durability = durability
+            self.file.data = iter([durability.encode()])
+            assert self.file.read_bytes() == durability.encode()
+
+        self.file.data_durability = 'sometimes'
+        with self.assertRaises(ValueError):
+            self.file.data = iter([b'x'])
+
+
+    def test_symlink_followed(self):
+        link = LocalPath(self.test_path, 'atomic-link')
+        link.symlink_to(self.file.name)
+        link.data = iter([b'through'])
+        assert link.is_symlink()
+        assert self.file.read_bytes() == b'through'
+
+    def test_empty(self):
+        for atomic in (True, False):
+            for empty in ((c for c in ()), [], ()):
+                self.file.write_bytes(b'original')
+                self.file.data_atomic = atomic
+                self.file.data = empty
+                assert self.file.read_bytes() == b''
+                assert not self._leftovers()
+
+        new = LocalPath(self.test_path, 'atomic-new')
+        new.data = iter([])
+        assert new.exists() and new.read_bytes() == b''
+
+    def test_list(self):
+        for atomic in (True, False):
+            self.file.data_atomic = atomic
+            self.file.data = [b'a', b'b']
+            assert self.file.read_bytes() == b'ab'
+
+    def test_data_setter_empty(self):
+        assert list(self.file._data_setter(iter([]))) == []
+        assert self.file.read_bytes() == b''
+
+
+class TestWriteVerified(FileHelper, unittest.TestCase):
+    file_name = 'verified-file'
+
+    def file_bytes(self):
+        return b'original'
+
+    def setUp(self):
+        super().setUp()
+        self.bytes = os.urandom(20000)
+        source = LocalPath(self.test_path, 'verified-source')
+        source.write_bytes(self.bytes)
+        self.checksum = source.checksum()
+        self.etag = source.etag(4096)
+
+    def chunks(self):
+        return (self.bytes[i:i + 3000] for i in range(0, len(self.bytes), 3000))
+
+    def test_ok(self):
+        checksum, etag = self.file.write_verified(
+            self.chunks(), size=len(self.bytes), checksum=self.checksum,
+            etag=self.etag, etag_chunksize=4096)
+        assert (checksum, etag) == (self.checksum, self.etag)
+        assert self.file.read_bytes() == self.bytes
+
+    def _bad(self, error, **kwargs):
+        with self.assertRaises(error):
+            self.file.write_verified(self.chunks(), **kwargs)
+
+        assert self.file.read_bytes() == b'original'
+        assert [c.name for c in self.test_path.iterdir()
+                if c.name.startswith('.')] == []
+
+    def test_size_mismatch(self):
+        self._bad(exc.SizeError, size=len(self.bytes) + 1)
+
+    def test_checksum_mismatch(self):
+        self._bad(exc.ChecksumError, checksum=b'\x00' * len(self.checksum))
+
+    def test_etag_mismatch(self):
+        self._bad(exc.ChecksumError, etag=(self.etag[0], 99), etag_chunksize=4096)
+
+
+class FetchCacheTest(CachePathTest):
+    cypher = default_cypher
+    payload = b''
+
+    @property
+    def data(self):
+        yield self.payload
+
+    @property
+    def local_object_cache_path(self):
+        return self.local.parent / 'no-objects'
+
+
+FetchCacheTest._bind_flavours()
+
+
+class TestFetchVerified(Helper, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_path.mkdir()
+        self.bytes = os.urandom(1000)
+        self.meta = PathMeta(id='N:package:1', file_id=5, size=len(self.bytes),
+                             checksum=FetchCacheTest.cypher(self.bytes).digest(),
+                             created='2020-01-01T00:00:00Z', updated='2020-01-02T00:00:00Z')
+        self.link = LocalPathTest(self.test_path, 'fetch-file')
+        self.link.symlink_to(self.meta.as_symlink(local_name=self.link.name))
+        self.symlink = os.readlink(self.link)
+
+    def _fetch(self, payload):
+        cache = FetchCacheTest(self.link)
+        cache.payload = payload
+        cache.fetch()
+
+    def test_fetch(self):
+        self._fetch(self.bytes)
+        assert not self.link.is_symlink()
+        assert self.link.read_bytes() == self.bytes
+        assert FetchCacheTest(self.link).meta.checksum == self.meta.checksum
+
+    def test_size_mismatch(self):
+        with self.assertRaises(ValueError):
+            self._fetch(self.bytes[:-1])
+
+        # no empty placeholder claiming the full size is left behind
+        assert self.link.is_symlink()
+        assert os.readlink(self.link) == self.symlink
+
+    def test_checksum_mismatch(self):
+        self._fetch(os.urandom(len(self.bytes)))
+        assert self.link.is_symlink()
+        meta = FetchCacheTest(self.link).meta
+        assert meta.size == len(self.bytes)
+        assert 'checksum-mismatch' in meta.errors
+
+
+class TestAio(FileHelper, unittest.TestCase):
+    file_name = 'aio-file'
+
+    def file_bytes(self):
+        return os.urandom(3 * 1024 ** 2 + 5)
+
+    def test_adata(self):
+        import asyncio
+        async def read():
+            return b''.join([chunk async for chunk in self.file.adata(chunksize=65536)])
+
+        assert asyncio.run(read()) == self.bytes
+
+    def test_awrite_data(self):
+        import asyncio
+        target = LocalPath(self.test_path, 'aio-target')
+        async def agen():
+            for i in range(0, len(self.bytes), 100000):
+                yield self.bytes[i:i + 100000]
+
+        asyncio.run(target.awrite_data(agen()))
+        assert target.read_bytes() == self.bytes
+        asyncio.run(target.awrite_data([b'a', b'b']))
+        assert target.read_bytes() == b'ab'
+
+    def test_awrite_data_empty(self):
+        import asyncio
+        async def agen():
+            return
+            yield
+
+        for chunks in (agen(), [], iter([])):
+            self.file.write_bytes(b'original')
+            asyncio.run(self.file.awrite_data(chunks))
+            assert self.file.read_bytes() == b''
+
+    def test_awrite_data_atomic(self):
+        import asyncio
+        async def agen():
+            yield b'partial'
+            raise ValueError('fetch failed')
+
+        self.file.data_atomic = True
+        with self.assertRaises(ValueError):
+            asyncio.run(self.file.awrite_data(agen()))
+
+        assert self.file.read_bytes() == self.bytes
+        assert [c for c in self.test_path.iterdir() if c.name.startswith('.')] == []
+
+    def test_awrite_data_from_adata(self):
+        # the source reads on the shared pool while the write holds a worker
+        import asyncio
+        targets = [LocalPath(self.test_path, f'aio-copy-{i}') for i in range(8)]
+        async def copies():
+            await asyncio.gather(*(t.awrite_data(self.file.adata(chunksize=65536))
+                                   for t in targets))
+
+        asyncio.run(copies())
+        assert all(t.read_bytes() == self.bytes for t in targets)
+
+    def test_ameta_achecksum(self):
+        import asyncio
+        import hashlib
+        async def both():
+            return await asyncio.gather(self.file.ameta(),
+                                        self.file.achecksum(),
+                                        self.file.achecksum(extra_cyphers=(hashlib.md5,)))
+
+        meta, checksum, (same, md5) = asyncio.run(both())
+        assert meta.size == len(self.bytes)
+        assert checksum == same == self.file.checksum()
+        assert md5 == hashlib.md5(self.bytes).digest()
+
+    def test_archildren(self):
+        import asyncio
+        d = LocalPath(self.test_path, 'aio-tree')
+        for i in range(10):
+            (d / str(i)).mkdir(parents=True)
+            (d / str(i) / 'f').touch()
+
+        async def walk():
+            return [c async for c in d.archildren(batch=3)]
+
+        assert sorted(asyncio.run(walk())) == sorted(d.rchildren)
+
+
+class TestScandir(Helper, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_path.mkdir()
+        tp = LocalPath(self.test_path)
+        (tp / 'a' / 'b').mkdir(parents=True)
+        (tp / 'a' / 'b' / 'f').touch()
+        (tp / 'a' / 'g').touch()
+        (tp / 'link-dir').symlink_to(tp / 'a')
+        (tp / 'broken').symlink_to(tp / 'does-not-exist')
+        self.tp = tp
+
+    def test_matches_rglob(self):
+        test = set(self.tp.rchildren)
+        expect = set(self.tp.rglob('*'))
+        assert test == expect, (test, expect)
+
+    def test_types_cached(self):
+        walked = list(self.tp.rscandir(cache=True))
+        paths = {p.name:p for p in walked}
+        assert paths['a']._dirent is not None
+        assert paths['a'].is_dir()
+        assert paths['f'].is_file()
+        assert paths['link-dir'].is_symlink() and paths['link-dir'].is_dir()
+        assert paths['broken'].is_broken_symlink()
+        assert not paths['broken'].exists()
+        # symlinked dirs are not traversed
+        assert len([p for p in walked if p.name == 'f']) == 1
+
+    def test_mutation_clears(self):
+        g, = [p for p in self.tp.rscandir(cache=True) if p.name == 'g']
+        assert g.is_file()
+        g.unlink()
+        assert not g.exists()
+        assert not g.is_file()
+
+    def test_not_cached(self):
+        for paths in (list(self.tp.rchildren), list(self.tp.children),
+                      list(self.tp.rscandir(jobs=2))):
+            assert all(p._dirent is None for p in paths)
+
+    def test_rchildren_cache(self):
+        walked = list(self.tp._rchildren(cache=True))
+        assert set(walked) == set(self.tp.rchildren)
+        assert all(p._dirent is not None for p in walked)
+        assert all(p._dirent is not None for p in self.tp._children(cache=True))
+
+    def test_changed_elsewhere(self):
+        # children and rchildren always ask the file system
+        g, = [p for p in self.tp.rchildren if p.name == 'g']
+        b, = [p for p in self.tp.rchildren if p.name == 'b']
+        assert g.is_file() and b.is_dir()
+        os.unlink(os.path.join(self.tp, 'a', 'g'))
+        assert not g.exists() and not g.is_file()
+        os.mkdir(os.path.join(self.tp, 'a', 'g'))
+        assert g.is_dir() and not g.is_file()
+        shutil.rmtree(os.path.join(self.tp, 'a', 'b'))
+        assert not b.exists() and not b.is_dir()
+
+    def test_cache_changed_elsewhere(self):
+        # the cached entry is a snapshot until invalidated
+        g, = [p for p in self.tp.rscandir(cache=True) if p.name == 'g']
+        os.unlink(os.path.join(self.tp, 'a', 'g'))
+        assert g.exists()
+        g.invalidate_stat()
+        assert not g.exists()
+
+
+class TestTreeParallel(Helper, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_path.mkdir()
+        tp = LocalPath(self.test_path)
+        for i in range(5):
+            for j in range(4):
+                d = tp / f'd{i}' / f'e{j}'
+                d.mkdir(parents=True)
+                if j % 2:
+                    (d / 'f').touch()
+
+        (tp / 'empty' / 'deeper').mkdir(parents=True)
+        (tp / 'link-dir').symlink_to(tp / 'd0')
+        self.tp = tp
+
+    def test_orders(self):
+        from augpathlib import tree
+        expect = set(self.tp.rglob('*'))
+        for order in tree.orders:
+            for jobs in (1, 4):
+                test = list(self.tp.rscandir(jobs=jobs, order=order))
+                assert len(test) == len(expect), (order, jobs)
+                assert set(test) == expect, (order, jobs)
+
+    def test_topdown(self):
+        from augpathlib import tree
+        seen = set()
+        for directory, children in tree.scandir_parallel(self.tp, jobs=4, order='topdown'):
+            assert directory == self.tp or directory.parent in seen
+            seen.add(directory)
+
+    def test_sorted(self):
+        from augpathlib import tree
+        for directory, children in tree.scandir_parallel(self.tp, jobs=4, order='sorted'):
+            names = [c.name for c in children]
+            assert names == sorted(names)
+
+    def test_errors(self):
+        from augpathlib import tree
+        missing = self.tp / 'missing'
+        for jobs in (1, 4):
+            with self.assertRaises(FileNotFoundError):
+                list(tree.scandir_parallel(missing, jobs=jobs))
+
+            errors = []
+            listed = list(tree.scandir_parallel(
+                missing, jobs=jobs, onerror=lambda f, p, e: errors.append(p)))
+            assert listed == [(missing, [])] and errors == [missing], jobs
+
+    def test_unreadable(self):
+        from augpathlib import tree
+        if os.name == 'nt' or os.getuid() == 0:
+            pytest.skip('permissions are not enforced')
+
+        locked = self.tp / 'd0'
+        locked.chmod(0o000)
+        try:
+            names = [c.name for c in self.tp.rchildren]
+            assert 'e0' not in names
+            with self.assertRaises(PermissionError):
+                list(locked.rchildren)
+        finally:
+            locked.chmod(0o700)
+
+    def test_rmdirtree(self):
+        self.tp.rmdirtree(jobs=4)
+        assert not (self.tp / 'empty').exists()
+        assert not (self.tp / 'd1' / 'e0').exists()
+        assert (self.tp / 'd1' / 'e1' / 'f').exists()
+        assert (self.tp / 'link-dir').is_symlink()
+
+    def test_rmtree(self):
+        self.tp.rmtree(jobs=4)
+        assert not self.tp.exists()
+        self.test_path.mkdir()  # for tearDown
+
+
+class TestRmtreeFd(Helper, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_path.mkdir()
+        tp = self.test_path
+        self.outside = tp / 'outside'
+        self.outside.mkdir()
+        (self.outside / 'keep').touch()
+        self.trash = tp / 'trash'
+        for i in range(6):
+            for j in range(3):
+                d = self.trash / f'd{i}' / f'e{j}' / 'f'
+                d.mkdir(parents=True)
+                (d / 'file').touch()
+                (d.parent / 'link').symlink_to(self.outside)
+
+    def test_rmtree_serial(self):
+        self.trash.rmtree()
+        assert not self.trash.exists()
+        assert (self.outside / 'keep').exists()
+
+    def test_rmtree_jobs(self):
+        self.trash.rmtree(jobs=4)
+        assert not self.trash.exists()
+        assert (self.outside / 'keep').exists()
+
+    def test_rmtree_onerror(self):
+        if os.name == 'nt' or os.getuid() == 0:
+            pytest.skip('permissions are not enforced')
+
+        locked = self.trash / 'd0' / 'e0'
+        locked.chmod(0o500)
+        errors = []
+        try:
+            self.trash.rmtree(onerror=lambda f, p, e: errors.append(p), jobs=4)
+        finally:
+            locked.chmod(0o700)
+
+        assert errors
+        assert locked.exists()
+        self.trash.rmtree(jobs=4)
+
+
+class TestRmtreeBackground(Helper, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_path.mkdir()
+        self.trash = self.test_path / 'trash'
+        for i in range(4):
+            d = self.trash / f'd{i}'
+            d.mkdir(parents=True)
+            (d / 'file').touch()
+
+    def test_background(self):
+        handle = self.trash.rmtree(background=True)
+        assert not self.trash.exists()
+        assert handle.trash.parent == self.trash.parent
+        assert handle.wait(10) is handle
+        assert handle.done()
+        assert not handle.trash.exists()
+        assert handle.removed == 9, handle
+        assert not handle.errors
+        assert list(self.test_path.iterdir()) == []
+
+    def test_background_missing(self):
+        missing = self.test_path / 'missing'
+        try:
+            missing.rmtree(background=True)
+            raise AssertionError('should have failed')
+        except FileNotFoundError:
+            pass
+
+        handle = missing.rmtree(background=True, ignore_errors=True)
+        assert handle.done() and handle.trash is None
+
+    def test_background_symlink(self):
+        link = self.test_path / 'link'
+        link.symlink_to(self.trash)
+        try:
+            link.rmtree(background=True)
+            raise AssertionError('should have failed')
+        except OSError:
+            pass
+
+        assert link.is_symlink()
+        assert (self.trash / 'd0' / 'file').exists()
+
+
+class TestCopyTree(Helper, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_path.mkdir()
+        self.source = LocalPath(self.test_path, 'source')
+        for i in range(3):
+            d = self.source / f'd{i}' / 'e'
+            d.mkdir(parents=True)
+            (d / 'file').write_bytes(f'data {i}'.encode() * 100)
+
+        (self.source / 'empty').mkdir()
+        (self.source / 'link').symlink_to('d0/e/file')
+        (self.source / 'broken').symlink_to('N:dataset:nope')
+        self.target = LocalPath(self.test_path, 'target')
+
+    def test_copy_tree(self):
+        results = list(self.source.copy_tree(self.target, jobs=4))
+        assert not [r for r in results if r[-1] is not None], results
+        expect = sorted(p.relative_to(self.source) for p in self.source.rchildren)
+        test = sorted(p.relative_to(self.target) for p in self.target.rchildren)
+        assert test == expect
+        assert len(results) == len(expect) + 1
+        for i in range(3):
+            rel = f'd{i}/e/file'
+            assert (self.target / rel).read_bytes() == (self.source / rel).read_bytes()
+
+        assert (self.target / 'link').readlink() == (self.source / 'link').readlink()
+        assert (self.target / 'broken').is_broken_symlink()
+        assert (self.target / 'empty').is_dir()
+
+    def test_copy_tree_exists(self):
+        self.target.mkdir()
+        try:
+            list(self.source.copy_tree(self.target))
+            raise AssertionError('should have failed')
+        except exc.PathExistsError:
+            pass
+
+        results = list(self.source.copy_tree(self.target, force=True, jobs=1))
+        assert not [r for r in results if r[-1] is not None], results
+        results = list(self.source.copy_tree(self.target, force=True))
+        assert not [r for r in results if r[-1] is not None], results
+
+
+@pytest.mark.skipif(sys.platform != 'linux', reason='not implemented')
+class TestSwapTransaction(Helper, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_path.mkdir()
+        self.new = self.test_path / 'new'
+        self.old = self.test_path / 'old'
+        self.new.mkdir()
+        self.old.mkdir()
+        for i in range(5):
+            (self.new / f'f{i}').write_bytes(b'new')
+            if i < 4:  # f4 is a new file
+                (self.old / f'f{i}').write_bytes(b'old')
+
+    def test_swap_children(self):
+        self.new.swap_children(self.old)
+        assert all((self.old / f'f{i}').read_bytes() == b'new' for i in range(5))
+        assert all((self.new / f'f{i}').read_bytes() == b'old' for i in range(4))
+        assert not (self.new / 'f4').exists()
+
+    def test_rollback(self):
+        try:
+            self.new.swap_children(self.old, names=['f0', 'f4', 'missing'])
+            raise AssertionError('should have failed')
+        except FileNotFoundError:
+            pass
+
+        assert (self.old / 'f0').read_bytes() == b'old'
+        assert (self.new / 'f0').read_bytes() == b'new'
+        assert (self.new / 'f4').read_bytes() == b'new'
+        assert not (self.old / 'f4').exists()
+
+    def test_swap_missing(self):
+        try:
+            self.new.swap(self.test_path / 'missing')
+            raise AssertionError('should have failed')
+        except FileNotFoundError as e:
+            assert 'target does not' in str(e)
+
+    def test_swap_missing_not_implemented(self):
+        # without an atomic swap missing paths are still reported first
+        from augpathlib import swap
+
+        class NoSwap(LocalPath):
+            _swap = swap.swap_not_implemented
+
+        NoSwap._bind_flavours()
+        with self.assertRaises(FileNotFoundError):
+            NoSwap(self.new).swap(NoSwap(self.test_path, 'missing'))
+
+        with self.assertRaises(NotImplementedError):
+            NoSwap(self.new).swap(NoSwap(self.old))
+
+    @pytest.mark.skipif(sys.platform != 'linux', reason='renameat2')
+    def test_rollback_after_commit(self):
+        from augpathlib import swap
+        with swap.SwapTransaction() as transaction:
+            transaction.add(self.new / 'f0', self.old / 'f0')
+            transaction.commit()
+            assert (self.old / 'f0').read_bytes() == b'new'
+            transaction.rollback()
+
+        assert (self.old / 'f0').read_bytes() == b'old'
+        with swap.SwapTransaction() as transaction:
+            transaction.add(self.new / 'f0', self.old / 'f0')
+
+        assert (self.old / 'f0').read_bytes() == b'new'
+        with self.assertRaises(ValueError):
+            transaction.rollback()
+
+        with self.assertRaises(ValueError):
+            transaction.add(self.new / 'f1', self.old / 'f1')
+
+
+class TestStatSnapshot(Helper, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_path.mkdir()
+        self.file = self.test_path / 'file'
+        self.file.write_bytes(b'12345')
+        self.broken = self.test_path / 'broken'
+        self.broken.symlink_to(self.test_path / 'nothing')
+
+    def test_scoped(self):
+        with AugmentedPath.stat_snapshots():
+            assert self.file.is_file() and self.file.exists()
+            assert self.broken.is_broken_symlink()
+            os.unlink(self.file)  # behind the path's back
+            assert self.file.exists()  # still the snapshot
+            self.file.invalidate_stat()
+            assert not self.file.exists()
+
+        self.file.touch()
+        assert self.file.exists()
+
+    def test_scoped_syscalls(self):
+        calls = []
+        lstat = os.lstat
+        def counting(path, *args, **kwargs):
+            calls.append(path)
+            return lstat(path, *args, **kwargs)
+
+        os.lstat = counting
+        try:
+            with AugmentedPath.stat_snapshots():
+                for _ in range(3):
+                    self.broken.is_broken_symlink()
+                    self.broken.is_file()
+                    self.broken.is_dir()
+        finally:
+            os.lstat = lstat
+
+        assert len(calls) == 1, calls
+
+    def test_opt_in(self):
+        class SnapPath(AugmentedPath):
+            stat_snapshot = True
+
+        SnapPath._bind_flavours()
+        path = SnapPath(self.file)
+        assert path.is_file()
+        path.write_bytes(b'')  # writing through the path invalidates
+        path.unlink()
+        assert not path.exists()
+        os.close(os.open(path, os.O_CREAT | os.O_WRONLY))
+        assert not path.exists()
+        path.invalidate_stat()
+        assert path.exists()
+
+
+@pytest.mark.skipif(sys.platform != 'linux', reason='statx is linux only')
+class TestStatx(FileHelper, unittest.TestCase):
+    def file_bytes(self):
+        return b'statx' * 100
+
+    def setUp(self):
+        super().setUp()
+        self.link = LocalPath(self.test_path, 'link')
+        self.link.symlink_to(self.file)
+
+    @pytest.mark.skipif(sys.platform != 'linux', reason='linux only')
+    def test_syscall_fallback(self):
+        # libc without a wrapper goes through syscall(2) with the same result
+        import ctypes
+        from augpathlib import statx
+        from augpathlib.utils import _libc_function
+        if not statx.available():
+            pytest.skip('no statx')
+
+        argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_uint,
+                    ctypes.POINTER(statx._statx))
+        try:
+            function = _libc_function('statx-no-wrapper', statx._SYS_statx, argtypes)
+        except NotImplementedError:
+            pytest.skip('unknown arch')
+
+        original = statx._function
+        statx._function = function
+        try:
+            via_syscall = statx.statx(self.file)
+        finally:
+            statx._function = original
+
+        assert via_syscall.st_ino == statx.statx(self.file).st_ino
+        with self.assertRaises(NotImplementedError):
+            _libc_function('statx-no-wrapper', {}, argtypes)
+
+    def test_matches_stat(self):
+        from augpathlib import statx
+        st = self.file.stat()
+        stx = statx.statx(self.file)
+        for field in ('st_mode', 'st_ino', 'st_dev', 'st_nlink', 'st_uid', 'st_gid',
+                      'st_size', 'st_blocks', 'st_mtime_ns', 'st_ctime_ns'):
+            assert getattr(stx, field) == getattr(st, field), field
+
+    def test_no_follow(self):
+        from augpathlib import statx
+        assert statx.statx(self.link, follow_symlinks=False).st_ino == self.link.lstat().st_ino
+        assert statx.statx(self.link).st_ino == self.file.stat().st_ino
+
+    def test_missing(self):
+        from augpathlib import statx
+        try:
+            statx.statx(self.test_path / 'missing')
+            raise AssertionError('should have failed')
+        except FileNotFoundError:
+            pass
+
+    def test_local_stat(self):
+        from augpathlib.statx import StatxResult
+        st = self.file._stat()
+        assert isinstance(st, StatxResult)
+        assert st.st_size == self.file.size
+
+
+class TestAnchorRchildren(TestPathHelper, unittest.TestCase):
+    def test_rchildren_cache(self):
+        (self.test_path / 'a' / 'b').mkdir(parents=True)
+        (self.test_path / 'a' / 'f').touch()
+        assert self.test_path == self.test_path.cache.anchor.local
+        walked = list(self.test_path._rchildren(cache=True))
+        assert set(walked) == set(self.test_path.rchildren)
+        assert {p.name for p in walked} >= {'a', 'b', 'f'}
+        assert all(p._dirent is not None for p in walked)
+
+
+class TestCacheRootIndex(TestPathHelper, unittest.TestCase):
+    def test_memoized(self):
+        from augpathlib import core
+        d = self.test_path / 'a' / 'b'
+        d.mkdir(parents=True)
+        f = d / 'f'
+        f.touch()
+        assert d.find_cache_root() == self.test_path
+        key = d._cache_class, os.fspath(d.absolute())
+        assert core._cache_roots[key] == self.test_path
+
+        def fail(self, fail=False):
+            raise AssertionError('should have used the index')
+
+        original = LocalPathTest._find_cache_root
+        LocalPathTest._find_cache_root = fail
+        try:
+            assert d.find_cache_root() == self.test_path
+            assert f.find_cache_root() == self.test_path
+            assert not f.skip_cache
+        finally:
+            LocalPathTest._find_cache_root = original
+
+    def test_relative_absolute(self):
+        from augpathlib import core
+        d = self.test_path / 'a' / 'b'
+        d.mkdir(parents=True)
+        (d / 'f').touch()
+        cwd = os.getcwd()
+        os.chdir(self.test_path.parent)
+        try:
+            rel = LocalPathTest(self.test_path.name, 'a', 'b')
+            for first, second in ((rel, d), (d, rel)):
+                core.invalidate_cache_roots()
+                for path in (first, second, first / 'f', second / 'f'):
+                    root = path.find_cache_root()
+                    assert root.is_absolute() and root == self.test_path, (path, root)
+
+            assert not (rel / 'f').skip_cache
+        finally:
+            os.chdir(cwd)
+
+    def test_invalidated(self):
+        from augpathlib import core
+        d = self.test_path / 'a'
+        d.mkdir()
+        d.find_cache_root()
+        assert core._cache_roots
+        d.cache_init('1')
+        assert not core._cache_roots
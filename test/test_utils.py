@@ -1,5 +1,6 @@
+import hashlib
 import unittest
-from augpathlib.utils import FileSize
+from augpathlib.utils import FileSize, etag
 
 class TestFileSize(unittest.TestCase):
     def test_0_getattr(self):
@@ -13,3 +14,52 @@ class TestFileSize(unittest.TestCase):
     def test_2_repr(self):
         s = FileSize(1)
         sr = str(s)
+
+
+def reference_etag(data, chunksize):
+    parts = [hashlib.md5(data[i:i + chunksize]).digest()
+             for i in range(0, len(data), chunksize)]
+    return hashlib.md5(b''.join(parts)).digest(), len(parts)
+
+
+class TestEtag(unittest.TestCase):
+    data = bytes(range(256)) * 41  # 10496 bytes
+
+    def _feed(self, chunksize, step):
+        m = etag(chunksize)
+        for i in range(0, len(self.data), step):
+            m.update(self.data[i:i + step])
+
+        return m
+
+    def test_chunkings(self):
+        for chunksize in (1000, 1024, 10496, 20000):
+            expect = reference_etag(self.data, chunksize)
+            for step in (1, 7, 1000, 1024, 4096, len(self.data)):
+                assert self._feed(chunksize, step).digest() == expect, (chunksize, step)
+
+    def test_exact_multiple(self):
+        m = self._feed(len(self.data) // 4, 1000)
+        assert m.digest()[1] == 4
+
+    def test_empty(self):
+        assert etag(1024).digest() == (hashlib.md5(b'').digest(), 0)
+
+    def test_early_digest(self):
+        m = etag(1000)
+        m.update(self.data[:1500])
+        early = m.digest()
+        assert early == reference_etag(self.data[:1500], 1000)
+        assert m.digest() == early
+        m.update(self.data[1500:])
+        assert m.digest() == reference_etag(self.data, 1000)
+
+    def test_memoryview(self):
+        m = etag(1000)
+        m.update(memoryview(bytearray(self.data)))
+        assert m.digest() == reference_etag(self.data, 1000)
+
+    def test_from_part_digests(self):
+        parts = [hashlib.md5(self.data[start:end]).digest()
+                 for start, end in etag.part_ranges(len(self.data), 1000)]
+        assert etag.from_part_digests(parts) == reference_etag(self.data, 1000)